@@ -1,7 +1,11 @@
 
-from abc import ABC, abstractmethod
-import os
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from abc import ABC
+import asyncio
+from contextlib import asynccontextmanager
+import hashlib
+import sys
+from pathlib import Path
+from langchain_core.messages import AIMessage, SystemMessage
 
 class AgentBase(ABC):
     def __init__(self,
@@ -9,6 +13,9 @@ class AgentBase(ABC):
         
         self.agent = None
         
+        # 异步对话使用的prompt_toolkit会话，在第一次输入时创建
+        self._prompt_session = None
+        
     def export_graph_png(self,
                          file_path: str,
                          ):
@@ -17,16 +24,24 @@ class AgentBase(ABC):
         
         try:
             # 创建输出目录
-            if not os.path.exists(file_path):
-                os.makedirs(file_path)
+            output_dir = Path(file_path)
+            output_dir.mkdir(parents=True, exist_ok=True)
+            
+            # 生成图并保存为PNG文件，draw_mermaid_png需要访问网络，按图的内容缓存结果
+            graph = self.agent.get_graph()
+            graph_hash = hashlib.sha256(graph.draw_mermaid().encode('utf-8')).hexdigest()
+            cache_file = Path.home() / ".cache" / "aquaagent" / f"{graph_hash}.png"
             
-            # 生成图并保存为PNG文件
-            graph_png = self.agent.get_graph().draw_mermaid_png()
+            if cache_file.exists():
+                graph_png = cache_file.read_bytes()
+            else:
+                graph_png = graph.draw_mermaid_png()
+                cache_file.parent.mkdir(parents=True, exist_ok=True)
+                cache_file.write_bytes(graph_png)
             
-            file_path = os.path.join(file_path, "agent_graph.png")
+            file_path = output_dir / "agent_graph.png"
             # 保存到文件
-            with open(file_path, "wb") as f:
-                f.write(graph_png)
+            file_path.write_bytes(graph_png)
             
             print(f"图表已保存到 {file_path}")
             
@@ -55,17 +70,107 @@ class AgentBase(ABC):
             events = self.agent.stream(
                 input_text,
                 config,
-                stream_mode="values"
+                stream_mode=["messages", "updates"]
             )
             
-            # 如果是system message，则不输出
-            for event in events:
-                message = event["messages"][-1]
-                if isinstance(message, SystemMessage):
-                    continue
-                else:
-                    message.pretty_print()
+            for stream_mode, event in events:
+                self._print_stream_event(stream_mode, event)
             
             print("\n===== Task completed. Enter your next query or type 'exit' to quit =====")
+    
+    def _print_stream_event(self, stream_mode, event):
+        """
+        输出stream_mode=["messages", "updates"]的一个事件，chat和achat共用
+        """
+        if stream_mode == "messages":
+            # LLM生成的token实时输出
+            message_chunk, metadata = event
+            if isinstance(message_chunk, AIMessage) and message_chunk.content:
+                sys.stdout.write(message_chunk.content)
+                sys.stdout.flush()
+            return
         
-
+        # updates模式只包含每个节点新增的消息
+        # 如果是system message，则不输出；AI回复已经流式输出，只显示工具调用
+        for update in event.values():
+            if not update:
+                continue
+            for message in update.get("messages", []):
+                if isinstance(message, SystemMessage):
+                    continue
+                if isinstance(message, AIMessage):
+                    # 文本内容已经在messages模式中输出，这里只显示工具调用，避免重复输出
+                    for tool_call in message.tool_calls:
+                        print(f"\n[Tool Call] {tool_call['name']}: {tool_call['args']}")
+                    continue
+                print()
+                message.pretty_print()
+    
+    @asynccontextmanager
+    async def _async_agent(self,):
+        """
+        异步调用时使用的agent，checkpointer需要单独的异步实现时由子类重写
+        """
+        yield self.agent
+    
+    async def _aread_input(self,):
+        """
+        异步读取用户输入，有prompt_toolkit时使用PromptSession并保存历史记录，否则在线程中调用input
+        """
+        if self._prompt_session is None:
+            try:
+                from prompt_toolkit import PromptSession
+                from prompt_toolkit.history import FileHistory
+            except ImportError:
+                self._prompt_session = False
+            else:
+                history_path = Path.home() / ".aquaagent_history"
+                self._prompt_session = PromptSession(history=FileHistory(str(history_path)))
+        
+        if self._prompt_session:
+            return await self._prompt_session.prompt_async("> ")
+        
+        try:
+            return await asyncio.to_thread(input, "> ")
+        except UnicodeDecodeError:
+            return sys.stdin.buffer.readline().decode('utf-8', errors='replace').strip()
+    
+    async def achat(self,):
+        """
+        异步版本的chat，使用astream进行token级流式输出，用户输入放到线程中执行，不阻塞事件循环
+        """
+        print("\n===== Enter your next query or type 'exit' to quit =====")
+        
+        config = {"configurable": {"thread_id": "1"}, "recursion_limit": 100}
+        async with self._async_agent() as agent:
+            await self._achat_loop(agent, config)
+    
+    async def _achat_loop(self, agent, config):
+        """
+        achat的对话循环
+        """
+        while True:
+            user_input = await self._aread_input()
+            
+            if user_input.lower() in ['exit', 'quit', 'q']:
+                print("Exiting the program...")
+                break
+            
+            print("\nProcessing your request...")
+            input_text = {"messages": [{"role": "user", "content": user_input}]}
+            
+            # 与chat相同，messages模式逐token输出，updates模式显示工具调用和工具结果
+            async for stream_mode, event in agent.astream(
+                input_text,
+                config,
+                stream_mode=["messages", "updates"]
+            ):
+                self._print_stream_event(stream_mode, event)
+            
+            print("\n\n===== Task completed. Enter your next query or type 'exit' to quit =====")
+    
+    def run(self,):
+        """
+        以异步方式启动对话
+        """
+        asyncio.run(self.achat())
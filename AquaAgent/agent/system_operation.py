@@ -2,14 +2,18 @@ from .agent_base import AgentBase
 from AquaAgent import aqua_config
 
 from langgraph.checkpoint.memory import MemorySaver
+import sqlite3
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
-from typing import Annotated, List
+from typing import Annotated
 from typing_extensions import TypedDict
 import operator
+import uuid
+from contextlib import asynccontextmanager
 
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage, trim_messages
+from langchain_core.messages.utils import count_tokens_approximately
 
 
 
@@ -33,6 +37,46 @@ SSH Tool User Guide:
 4. When performing sudo operations, the SSH tool automatically fills in the password, eliminating the need to manually enter it.
 """
 
+# 系统提示消息只创建一次；指定固定的id，add_messages不会再就地给这个共享对象分配id
+_SYSTEM_MSG = SystemMessage(content=sys_prompt, id="system-prompt")
+
+def _trim_history(messages, max_tokens):
+    """
+    截断发送给LLM的历史消息：系统提示和当前请求(最后一条用户消息及其后的工具调用和结果)
+    总是保留，只在剩余的token预算内从用户消息开始保留更早的对话，避免拆开工具调用和结果
+    
+    参数:
+        messages (list): 对话中的全部消息
+        max_tokens (int): 历史消息的token上限
+        
+    返回:
+        list: 系统提示在前，之后依次是保留的历史对话和当前请求
+    """
+    last_human = 0
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            last_human = i
+            break
+    
+    system_messages = [m for m in messages if isinstance(m, SystemMessage)]
+    current_turn = [m for m in messages[last_human:] if not isinstance(m, SystemMessage)]
+    earlier = [m for m in messages[:last_human] if not isinstance(m, SystemMessage)]
+    
+    budget = max_tokens - count_tokens_approximately(system_messages + current_turn)
+    if earlier and budget > 0:
+        earlier = trim_messages(
+            earlier,
+            max_tokens=budget,
+            strategy="last",
+            token_counter=count_tokens_approximately,
+            start_on="human",
+        )
+    else:
+        earlier = []
+    
+    return system_messages + earlier + current_turn
+
+
 class State(TypedDict):
     messages: Annotated[list, add_messages]
     conversation_count: Annotated[int, operator.add] = 0
@@ -41,9 +85,16 @@ class State(TypedDict):
 
 class SystemOperationAgent(AgentBase):
     def __init__(self,
+                 max_history_tokens: int = 16384,
+                 max_tool_rounds: int = 20,
                  ):
         super().__init__()
         
+        # 每次调用LLM时保留的历史消息token上限
+        self.max_history_tokens = max_history_tokens
+        # 每个用户请求最多的工具调用轮数
+        self.max_tool_rounds = max_tool_rounds
+        
         self.ubuntu_llm = aqua_config.llm_model_dict['common']
         
         llm_tools = [
@@ -54,41 +105,158 @@ class SystemOperationAgent(AgentBase):
         
         self.ubuntu_llm_with_tools = self.ubuntu_llm.bind_tools(llm_tools)
         
-        
-        self.sys_prompt = sys_prompt
-        
+        # 图的节点绑定了本实例的方法，每个实例编译自己的图
+        self.checkpoint_path = aqua_config.checkpoint_path
+        self.agent_builder, self.agent = self._build_graph(
+            llm_tools, self._build_checkpointer(self.checkpoint_path)
+        )
+    
+    def _build_graph(self, llm_tools, checkpointer):
+        """
+        组装并编译agent图
+        """
         tools_node = ToolNode(llm_tools)
         
         # 组装agent
-        self.agent_builder = StateGraph(State)
+        agent_builder = StateGraph(State)
         
-        self.agent_builder.add_node("get_system_prompt", self.get_system_prompt)
-        self.agent_builder.add_node("chat_llm", self.chat_llm)
-        self.agent_builder.add_node("tools", tools_node)
+        agent_builder.add_node("get_system_prompt", self.get_system_prompt)
+        agent_builder.add_node("chat_llm", self.chat_llm)
+        agent_builder.add_node("tools", tools_node)
+        agent_builder.add_node("tool_limit", self.tool_limit_reached)
         
-        self.agent_builder.add_edge(START, "get_system_prompt")
-        self.agent_builder.add_edge("get_system_prompt", "chat_llm")
-        self.agent_builder.add_conditional_edges(
+        agent_builder.add_edge(START, "get_system_prompt")
+        agent_builder.add_edge("get_system_prompt", "chat_llm")
+        agent_builder.add_conditional_edges(
                 "chat_llm",
-                tools_condition,
+                self.limited_tools_condition,
+                {"tools": "tools", "tool_limit": "tool_limit", END: END},
         )
-        self.agent_builder.add_edge("tools", "chat_llm")
+        agent_builder.add_edge("tools", "chat_llm")
+        agent_builder.add_edge("tool_limit", END)
         
-        memory_saver = MemorySaver()
-        self.agent = self.agent_builder.compile(checkpointer=memory_saver)
+        return agent_builder, agent_builder.compile(checkpointer=checkpointer)
+    
+    def _build_checkpointer(self, checkpoint_path):
+        """
+        创建同步调用使用的checkpointer，配置了路径时使用sqlite持久化，否则使用内存；
+        SqliteSaver不支持异步方法，异步调用的checkpointer见_async_agent
+        """
+        if checkpoint_path is None:
+            return MemorySaver()
+        
+        from langgraph.checkpoint.sqlite import SqliteSaver
+        
+        conn = sqlite3.connect(checkpoint_path, check_same_thread=False)
+        return SqliteSaver(conn)
+    
+    @asynccontextmanager
+    async def _async_agent(self):
+        """
+        配置了sqlite持久化时，异步调用改用AsyncSqliteSaver，连接在当前事件循环中创建，用完后关闭
+        """
+        if self.checkpoint_path is None:
+            yield self.agent
+            return
+        
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        
+        async with AsyncSqliteSaver.from_conn_string(self.checkpoint_path) as checkpointer:
+            yield self.agent.copy(update={"checkpointer": checkpointer})
     
     def get_system_prompt(self,state: State):
         if state["conversation_count"] == 0:
-            return {"messages": [SystemMessage(content=self.sys_prompt)], "conversation_count": 1}
+            return {"messages": [_SYSTEM_MSG], "conversation_count": 1}
         return {"conversation_count": 1}
     
+    def limited_tools_condition(self, state: State):
+        """
+        在tools_condition基础上限制每个用户请求的工具调用轮数，超过后转到tool_limit节点结束
+        """
+        tool_rounds = 0
+        for message in reversed(state["messages"]):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage) and message.tool_calls:
+                tool_rounds += 1
+        
+        if tool_rounds > self.max_tool_rounds:
+            return "tool_limit"
+        return tools_condition(state)
+    
+    def tool_limit_reached(self, state: State):
+        """
+        工具调用轮数超过上限时，为最后一条AI消息中未执行的工具调用补上ToolMessage，
+        再加一条说明已停止的AI消息；保存的对话中每个tool_call都有对应的结果，
+        否则下一轮请求会被OpenAI兼容的接口拒绝
+        """
+        skipped = f"Not executed: the limit of {self.max_tool_rounds} tool rounds for this request was reached."
+        messages = [
+            ToolMessage(content=skipped, tool_call_id=tool_call["id"], name=tool_call["name"])
+            for tool_call in state["messages"][-1].tool_calls
+        ]
+        messages.append(AIMessage(
+            content=f"Stopped after {self.max_tool_rounds} tool rounds without finishing the task. "
+                    "Send a new message to continue."
+        ))
+        return {"messages": messages}
+    
     def chat_llm(self,state: State):
         
             
         messages = state["messages"]
         
+        # 只保留系统提示、当前请求和预算内最近的对话
+        trimmed_messages = _trim_history(messages, self.max_history_tokens)
         
-        return {"messages": [self.ubuntu_llm_with_tools.invoke(messages)]}
+        return {"messages": [self.ubuntu_llm_with_tools.invoke(trimmed_messages)]}
+    
+    def _build_batch_inputs(self, prompts, thread_ids=None, max_concurrency=10):
+        """
+        为每个prompt构建独立的输入和config，每个prompt使用不同的thread_id；
+        默认的thread_id带有每次调用唯一的前缀，不会续接之前批次的对话
+        """
+        if thread_ids is None:
+            batch_id = uuid.uuid4().hex
+            thread_ids = [f"batch-{batch_id}-{i}" for i in range(len(prompts))]
+        if len(thread_ids) != len(prompts):
+            raise ValueError("thread_ids must have the same length as prompts")
+        
+        inputs = [{"messages": [{"role": "user", "content": prompt}]} for prompt in prompts]
+        configs = [
+            {
+                "configurable": {"thread_id": thread_id},
+                "recursion_limit": 100,
+                "max_concurrency": max_concurrency,
+            }
+            for thread_id in thread_ids
+        ]
+        return inputs, configs
+    
+    def run_batch(self, prompts, thread_ids=None, max_concurrency=10):
+        """
+        批量执行多个请求
+        
+        参数:
+            prompts (list): 用户请求列表
+            thread_ids (list): 每个请求对应的thread_id，默认自动生成
+            max_concurrency (int): 最大并发数，应根据LLM服务的速率限制调整
+            
+        返回:
+            list: 每个请求的最后一条消息
+        """
+        inputs, configs = self._build_batch_inputs(prompts, thread_ids, max_concurrency)
+        results = self.agent.batch(inputs, configs)
+        return [result["messages"][-1] for result in results]
+    
+    async def run_batch_async(self, prompts, thread_ids=None, max_concurrency=10):
+        """
+        异步批量执行多个请求，参数与run_batch相同
+        """
+        inputs, configs = self._build_batch_inputs(prompts, thread_ids, max_concurrency)
+        async with self._async_agent() as agent:
+            results = await agent.abatch(inputs, configs)
+        return [result["messages"][-1] for result in results]
         
         
         
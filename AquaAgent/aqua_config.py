@@ -1,6 +1,45 @@
-from yaml import load, dump
-from yaml import Loader, Dumper
-from pprint import pprint
+import importlib
+import json
+import os
+
+from yaml import load
+try:
+    # 优先使用libyaml的C实现
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
+# LLM类型对应的(模块, 类名)，只在用到时才导入
+_LLM_BACKENDS = {
+    'ollama': ('langchain_ollama', 'ChatOllama'),
+    'openai': ('langchain_openai', 'ChatOpenAI'),
+}
+
+# 已导入的LLM类缓存
+_LLM_CLASSES = {}
+
+
+def _get_llm_class(llm_type: str):
+    """
+    按需导入LLM类，同一类型只导入一次
+    """
+    if llm_type not in _LLM_CLASSES:
+        if llm_type not in _LLM_BACKENDS:
+            raise ValueError(f'Unsupported LLM type: {llm_type}')
+        module_name, class_name = _LLM_BACKENDS[llm_type]
+        _LLM_CLASSES[llm_type] = getattr(importlib.import_module(module_name), class_name)
+    return _LLM_CLASSES[llm_type]
+
+
+def _has_only_str_keys(value):
+    """
+    检查配置中所有字典的键是否都是字符串，JSON会把其他类型的键转换为字符串
+    """
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and _has_only_str_keys(item) for key, item in value.items())
+    if isinstance(value, list):
+        return all(_has_only_str_keys(item) for item in value)
+    return True
 
 class AquaConfig:
     """
@@ -11,6 +50,14 @@ class AquaConfig:
         self.llm_model_dict = {}
         self.llm_model_config = None
         self.tool_config = None
+        self.cache_config = None
+        
+        # 对话状态持久化路径，None时使用内存
+        self.checkpoint_path = None
+        
+        # 共享的同步HTTP连接池，在第一次需要时创建；异步连接属于创建它的事件循环，
+        # 多次asyncio.run之间无法共享，因此不创建共享的异步客户端
+        self.http_client = None
         
         # SSH_Tool
         self.ssh_tool = None
@@ -22,47 +69,126 @@ class AquaConfig:
         self.web_search_tool = None
         
 
-    def load_config(self, config_path: str):
-        with open(config_path, 'r') as f:
-            config = load(f, Loader=Loader)
+    def load_config(self, config_path: str, use_cache: bool = False):
+        """
+        读取配置文件
+        
+        参数:
+            config_path (str): YAML配置文件路径
+            use_cache (bool): 是否使用JSON缓存文件，默认关闭。注意缓存文件会以明文
+                保存配置中的API key和SSH密码等敏感信息
+        """
+        config = self._read_config(config_path, use_cache)
             
         self.llm_model_config = config['LLMs']
         self.tool_config = config['Tools']
+        self.cache_config = config.get('Cache', {})
+        self.checkpoint_path = config.get('Checkpoint', {}).get('path')
         
+        self.init_llm_cache()
         self.init_llm_model()
         self.init_tool()
         
     
+    def _read_config(self, config_path: str, use_cache: bool = False):
+        """
+        读取YAML配置，启用缓存时解析结果缓存为同目录下的JSON文件(仅当前用户可读写)，
+        YAML未修改时直接读取JSON；含有非字符串键的配置无法无损转换为JSON，不缓存
+        """
+        cache_path = config_path + '.cache.json'
+        
+        if use_cache and os.path.exists(cache_path) and \
+                os.path.getmtime(cache_path) >= os.path.getmtime(config_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        
+        with open(config_path, 'r') as f:
+            config = load(f, Loader=_Loader)
+        
+        if use_cache:
+            try:
+                if not _has_only_str_keys(config):
+                    raise TypeError('config contains non-string keys')
+                # 缓存中包含密码等敏感信息，只允许当前用户读写
+                fd = os.open(cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with open(fd, 'w') as f:
+                    os.fchmod(fd, 0o600)
+                    json.dump(config, f)
+            except (OSError, TypeError, ValueError):
+                # 无法写入或包含无法序列化的值时不使用缓存
+                if os.path.exists(cache_path):
+                    os.remove(cache_path)
+        
+        return config
+    
+    def init_llm_cache(self):
+        """
+        根据Cache配置设置全局LLM响应缓存，相同的请求直接返回缓存结果
+        """
+        if not self.cache_config:
+            return
+        
+        cache_type = self.cache_config.get('type')
+        
+        if cache_type == 'sqlite':
+            from langchain_core.globals import set_llm_cache
+            from langchain_community.cache import SQLiteCache
+            
+            set_llm_cache(SQLiteCache(
+                database_path=self.cache_config.get('path', '.aqua_llm_cache.db')
+            ))
+            
+        elif cache_type == 'redis':
+            import redis
+            from langchain_core.globals import set_llm_cache
+            from langchain_community.cache import RedisCache
+            
+            set_llm_cache(RedisCache(
+                redis_=redis.Redis.from_url(self.cache_config['url'])
+            ))
+            
+        else:
+            raise ValueError(f'Unsupported cache type: {cache_type}')
+    
+    def init_http_client(self):
+        """
+        创建共享的同步HTTP连接池
+        """
+        if self.http_client is not None:
+            return
+        
+        import httpx
+        
+        limits = httpx.Limits(max_keepalive_connections=20, max_connections=50)
+        self.http_client = httpx.Client(timeout=60, limits=limits)
+    
     def init_llm_model(self):
         for llm_model_name, llm_model_config in self.llm_model_config.items():
             
             llm_type = llm_model_config['type']
             
-            if llm_type == 'ollama':
-                from langchain_ollama import ChatOllama
-                
-                llm = ChatOllama(
-                    **llm_model_config['params']
-                )
-                
-                self.llm_model_dict[llm_model_name] = llm
-                
-            elif llm_type == 'openai':
-                from langchain_openai import ChatOpenAI
-                
-                llm = ChatOpenAI(
-                    **llm_model_config['params']
-                )
-                
-                self.llm_model_dict[llm_model_name] = llm
-                
-            else:
-                raise ValueError(f'Unsupported LLM type: {llm_type}')
+            # 非确定性的模型可以通过cache: false关闭缓存
+            llm_params = dict(llm_model_config['params'])
+            if 'cache' in llm_model_config:
+                llm_params['cache'] = llm_model_config['cache']
+            
+            # openai客户端的同步请求共享同一个连接池，复用TCP/TLS连接
+            if llm_type == 'openai':
+                self.init_http_client()
+                llm_params.setdefault('http_client', self.http_client)
+            
+            llm_class = _get_llm_class(llm_type)
+            
+            self.llm_model_dict[llm_model_name] = llm_class(
+                **llm_params
+            )
             
     def init_tool(self):
-        from AquaAgent.core.tool import ObtainWebContentTool, SearxSearchTool, SSHTool, TavilySearchTool
-                
         # SSH_Tool
+        from AquaAgent.core.tool import SSHTool
         
         print("#############init ssh tool: #############")
         debug_mode = self.tool_config['SSH_Tool']['params']['debug_mode'] 
@@ -77,21 +203,35 @@ class AquaConfig:
         self.ssh_tool.init_ssh()
         
         if "pre_execute" in self.tool_config['SSH_Tool']:
-            for command in self.tool_config['SSH_Tool']['pre_execute']:
+            pre_execute_commands = self.tool_config['SSH_Tool']['pre_execute']
+            if isinstance(pre_execute_commands, str):
+                pre_execute_commands = [pre_execute_commands]
+            
+            # 每条命令单独执行，等上一条命令的提示符出现后再发送下一条，
+            # 避免前一条命令的输出混入后续命令的结果
+            for command in pre_execute_commands:
                 self.ssh_tool.add_pre_execute_command(command)
             
         self.ssh_tool.pre_execute()
         print("#############ssh tool init success#############")
         
         # Web_Scrape_Tool
+        from AquaAgent.core.tool import ObtainWebContentTool
         self.web_scrape_tool = ObtainWebContentTool()
         
         # Web_Search_Tool
         web_search_module_name = self.tool_config['Web_Search_Tool']['name']
         
-        eval_web_search_tool = eval(web_search_module_name)
+        from AquaAgent.core.tool import SearxSearchTool, TavilySearchTool
+        search_tools = {
+            'SearxSearchTool': SearxSearchTool,
+            'TavilySearchTool': TavilySearchTool,
+        }
+        
+        if web_search_module_name not in search_tools:
+            raise ValueError(f'Unsupported web search tool: {web_search_module_name}')
         
-        self.web_search_tool = eval_web_search_tool(
+        self.web_search_tool = search_tools[web_search_module_name](
             **self.tool_config['Web_Search_Tool']['params']
         ).get_searh_tool()
             
\ No newline at end of file
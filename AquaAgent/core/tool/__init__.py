@@ -1,3 +1,18 @@
-from .obtain_web_content import ObtainWebContentTool
-from .ssh import SSHTool
-from .search import SearxSearchTool, TavilySearchTool
\ No newline at end of file
+import importlib
+
+# 工具类所在的子模块，按需导入，避免加载未使用工具的依赖
+_TOOL_MODULES = {
+    'ObtainWebContentTool': '.obtain_web_content',
+    'SSHTool': '.ssh',
+    'SearxSearchTool': '.search',
+    'TavilySearchTool': '.search',
+}
+
+__all__ = list(_TOOL_MODULES)
+
+
+def __getattr__(name):
+    if name in _TOOL_MODULES:
+        module = importlib.import_module(_TOOL_MODULES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
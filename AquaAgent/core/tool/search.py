@@ -1,7 +1,4 @@
-from langchain_community.utilities import SearxSearchWrapper
-from langchain_community.tools.searx_search.tool import SearxSearchResults
 from abc import ABC, abstractmethod
-from langchain_community.tools.tavily_search import TavilySearchResults
 import os
 
 
@@ -14,27 +11,53 @@ class BaseSearchTool(ABC):
         pass
 
 class SearxSearchTool(BaseSearchTool):
+    DEFAULT_ENGINES = ["ask", "360search", "alexandria", "wikisource", "bing", "baidu"]
+    
     def __init__(self,
                  searx_host: str,
+                 engines: list = None,
+                 max_results: int = 5,
                  ):
-        search_wrapper = SearxSearchWrapper(
+        from langchain_community.utilities import SearxSearchWrapper
+        
+        self.search_wrapper = SearxSearchWrapper(
             searx_host=searx_host,
         )
         
-        self.search_tool = SearxSearchResults(wrapper=search_wrapper,
+        self.engines = engines if engines is not None else list(self.DEFAULT_ENGINES)
+        self.max_results = max_results
+        
+        self.search_tool = self._build_search_tool(self.engines, self.max_results)
+        
+    def _build_search_tool(self, engines, max_results):
+        from langchain_community.tools.searx_search.tool import SearxSearchResults
+        
+        return SearxSearchResults(wrapper=self.search_wrapper,
+                            num_results=max_results,
                             kwargs = {
-                                "engines": ["ask", "360search", "alexandria", "wikisource","bing","baidu"],
-                                "max_results": 10,
+                                "engines": engines,
+                                "max_results": max_results,
                                 })
 
-    def get_searh_tool(self):
-        return self.search_tool
+    def get_searh_tool(self, engines: list = None, max_results: int = None):
+        """
+        获取搜索工具，可以为单次使用覆盖搜索引擎和结果数量
+        """
+        if engines is None and max_results is None:
+            return self.search_tool
+        
+        return self._build_search_tool(
+            engines if engines is not None else self.engines,
+            max_results if max_results is not None else self.max_results,
+        )
 
 
 class TavilySearchTool(BaseSearchTool):
     def __init__(self,
                  tavily_api_key: str,
                  ):
+        from langchain_community.tools.tavily_search import TavilySearchResults
+        
         os.environ["TAVILY_API_KEY"] = tavily_api_key
         self.search_tool = TavilySearchResults()
         
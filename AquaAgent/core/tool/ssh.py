@@ -1,8 +1,14 @@
 import paramiko
+import io
+import codecs
+import socket
 from pathlib import Path
 import logging
 import time
 import re
+import sys
+import selectors
+from collections import deque
 from typing import ClassVar, List
 
 from langchain_core.tools import BaseTool
@@ -10,6 +16,176 @@ from langchain_core.tools.base import ArgsSchema
 from pydantic import BaseModel, Field
 from langchain_core.messages import ToolMessage
 
+try:
+    # google-re2为可选依赖，安装后合并正则使用线性时间的DFA引擎匹配
+    import re2
+except ImportError:
+    re2 = None
+
+
+# 匹配正则开头的全局标志，如(?i)
+_INLINE_FLAGS_RE = re.compile(r'\(\?([aiLmsux]+)\)')
+
+# 行尾的ANSI颜色序列(SGR)和空白，带颜色的提示符常以颜色重置序列结尾
+_TRAILING_SGR_RE = re.compile(r'(?:\x1b\[[0-9;]*m|\s)+$')
+
+# 正则元字符，不包含这些字符的模式等价于固定字符串
+_REGEX_METACHARS = '.^$*+?{}[]\\|()'
+
+
+def _build_union_pattern(patterns):
+    """
+    将多个正则表达式合并为一个带命名分组的正则，一次扫描即可匹配所有模式
+    
+    参数:
+        patterns (list): 正则表达式字符串列表
+        
+    返回:
+        合并后的正则(安装了google-re2时为re2对象，否则为re.Pattern)，第i个模式对应分组p{i}
+    """
+    parts = []
+    for i, pattern in enumerate(patterns):
+        # 开头的全局标志(如(?i))在合并后不再位于开头，转换为局部标志
+        flags_match = _INLINE_FLAGS_RE.match(pattern)
+        if flags_match:
+            pattern = f'(?{flags_match.group(1)}:{pattern[flags_match.end():]})'
+        parts.append(f'(?P<p{i}>{pattern})')
+    union = '|'.join(parts)
+    if re2 is not None:
+        try:
+            return re2.compile('(?m)' + union)
+        except re2.error:
+            # 包含RE2不支持的语法(如反向引用)时回退到re模块
+            pass
+    return re.compile(union, re.MULTILINE)
+
+
+def _compile_literals(literals, ignore_case=False):
+    """
+    将一组固定文本转义后合并为一个正则，安装了google-re2时使用线性时间的DFA引擎
+    
+    参数:
+        literals (iterable): 固定文本
+        ignore_case (bool): 是否忽略大小写
+        
+    返回:
+        合并后的正则(re2对象或re.Pattern)，只使用search方法
+    """
+    pattern = '|'.join(map(re.escape, literals))
+    if re2 is not None:
+        try:
+            return re2.compile(('(?i)' if ignore_case else '') + pattern)
+        except re2.error:
+            pass
+    return re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+
+
+def _build_literal_matcher(literals):
+    """
+    为一组固定文本构建查找函数。安装了google-re2时合并为一个DFA正则，一次扫描即可；
+    否则逐个用子串查找，CPython中这比re模块的多分支正则更快
+    
+    参数:
+        literals (tuple): 固定文本
+        
+    返回:
+        callable: 接收文本，返回其中出现的一个固定文本，未出现时返回None
+    """
+    if re2 is not None:
+        try:
+            search = re2.compile('|'.join(map(re.escape, literals))).search
+        except re2.error:
+            pass
+        else:
+            def match_literal(text):
+                match = search(text)
+                return match.group() if match else None
+            return match_literal
+    
+    def match_literal(text):
+        for literal in literals:
+            if literal in text:
+                return literal
+        return None
+    return match_literal
+
+
+def _union_match_index(match):
+    """
+    获取合并正则匹配到的原始模式序号
+    """
+    return int(match.lastgroup[1:])
+
+
+def _tail_lines(text, n):
+    """
+    从末尾向前查找换行符，取出最后n行，不构造完整的行列表
+    
+    参数:
+        text (str): 输出内容
+        n (int): 行数
+        
+    返回:
+        str: 最后n行组成的文本(行间保留原有换行符)
+    """
+    end = len(text)
+    # 与splitlines一致，忽略末尾的换行符
+    if text.endswith('\n'):
+        end -= 1
+    start = end
+    for _ in range(n):
+        start = text.rfind('\n', 0, start)
+        if start < 0:
+            return text[:end]
+    return text[start + 1:end]
+
+
+# 命令类别分类器：一次扫描即可得到命令所属的全部类别
+_CMD_CLASSIFIER = re.compile(
+    r"(?P<sudo>\bsudo\s)"
+    r"|(?P<apt_update>\bapt(?:-get)?\s+update\b)"
+    r"|(?P<docker_pull>\bdocker\s+pull\b)"
+    r"|(?P<docker_logs_follow>\bdocker\s+logs\s[^;|&\n]*?(?<!\S)(?:-[a-z]*f[a-z]*|--follow)\b)"
+    # 短选项可以合并(tail -fn 100、journalctl -fu nginx)；区分大小写，-F只对tail表示跟踪，
+    # journalctl -F是--field
+    r"|(?P<log_follow>(?-i:\btail\s[^;|&\n]*?(?<!\S)(?:-[A-Za-z]*f[A-Za-z]*|-F|--follow)\b"
+    r"|\bjournalctl\s[^;|&\n]*?(?<!\S)(?:-[A-Za-z]*f[A-Za-z]*|--follow)\b))"
+    r"|(?P<docker>\bdocker\s)"
+    r"|(?P<apt>\bapt(?:-get)?\b)"
+    r"|(?P<conda_create>\bconda\s+create\b)"
+    r"|(?P<conda>\bconda\s)"
+    r"|(?P<download>\b(?:yum|dnf|pip\d*|npm|wget|curl|install|update|upgrade|git|clone)\b)",
+    re.IGNORECASE,
+)
+
+# 细分类别隐含的上级类别
+_CMD_IMPLIED_CATEGORIES = {
+    'apt_update': ('apt', 'download'),
+    'apt': ('download',),
+    'docker_pull': ('docker',),
+    'docker_logs_follow': ('docker', 'follow'),
+    'log_follow': ('follow',),
+    'conda_create': ('conda', 'download'),
+    'conda': ('download',),
+}
+
+
+def _classify_command(command):
+    """
+    对命令进行分类
+    
+    参数:
+        command (str): 要执行的命令
+        
+    返回:
+        frozenset: 命令所属的类别名称集合，如{'sudo', 'apt', 'download'}
+    """
+    categories = set()
+    for match in _CMD_CLASSIFIER.finditer(command):
+        categories.add(match.lastgroup)
+        categories.update(_CMD_IMPLIED_CATEGORIES.get(match.lastgroup, ()))
+    return frozenset(categories)
+
 
 class SSHToolInput(BaseModel):
     command: str = Field(description="Bash commands to be executed on the user's computer")
@@ -24,6 +200,48 @@ class SSHTool(BaseTool):
     args_schema: ArgsSchema = SSHToolInput
     return_direct: bool = False
     
+    # 检测提示符等模式时扫描的输出末尾长度
+    OUTPUT_SCAN_TAIL: ClassVar[int] = 4096
+    
+    # 各命令类别的超时时间(秒)和日志说明，按优先级排列，命中的第一个类别生效
+    COMMAND_TIMEOUTS: ClassVar[tuple] = (
+        ('sudo', 30, "检测到sudo命令，使用特殊处理逻辑"),
+        ('docker_pull', 30, "检测到docker pull命令，使用特殊处理逻辑"),
+        ('docker', 30, "检测到docker命令，使用特殊处理逻辑"),
+        ('apt_update', 30, "检测到apt-get update命令，使用特殊处理逻辑"),
+        ('apt', 30, "检测到apt命令，使用特殊处理逻辑"),
+        ('conda', 30, "检测到conda命令，使用特殊处理逻辑"),
+        ('download', 30, "检测到可能的下载或安装命令，增加超时时间"),
+    )
+    DEFAULT_COMMAND_TIMEOUT: ClassVar[int] = 30
+    
+    # 下载模式下长时间无进度时，各命令类别自开始执行起仍继续等待的宽限时间(秒)和日志说明，
+    # 按优先级排列，命中的第一个类别生效
+    DOWNLOAD_STALL_GRACE: ClassVar[tuple] = (
+        ('docker_pull', 3600, "Docker pull操作中，给予更多耐心等待时间"),
+        ('docker', 1800, "Docker操作中，给予更多耐心等待时间"),
+        ('conda_create', 1800, "conda创建环境中，给予更多耐心等待时间"),
+    )
+    
+    # 阻塞读取时等待通道可读的最长时间(秒)，期间线程在内核中休眠
+    READ_POLL_INTERVAL: ClassVar[float] = 0.25
+    
+    # 读取循环中每次唤醒最多读取的字节数，持续大量输出时也能按时执行完成检测和超时判断
+    MAX_DRAIN_BYTES: ClassVar[int] = 1 << 20
+    
+    # 下载进度检测只扫描新数据，并带上前一次数据末尾的这些字符，以免漏掉跨两次读取的进度标记
+    PROGRESS_SCAN_CARRY: ClassVar[int] = 64
+    
+    # 交互式shell通道的接收窗口大小(字节)，比paramiko默认的2MB更大，
+    # 大量输出时远端不必频繁等待窗口调整
+    CHANNEL_WINDOW_SIZE: ClassVar[int] = 4 * 1024 * 1024
+    
+    # 流式命令回显到控制台时两次强制刷新之间的最长间隔(秒)
+    ECHO_FLUSH_INTERVAL: ClassVar[float] = 0.05
+    
+    # 读取过程中保留的最少完整行数，tail_lines更大时按tail_lines保留
+    OUTPUT_BUFFER_LINES: ClassVar[int] = 200
+    
     # 默认的shell提示符匹配模式
     DEFAULT_PROMPT_PATTERNS: ClassVar[List[str]] = [
         # Docker中Anaconda环境的特殊匹配
@@ -33,19 +251,66 @@ class SSHTool(BaseTool):
         r'\r?\n\([^)]+\)\s+[^\s@]+@[^\s:]+:[^\s]+[#\$]\s*$',  # (env) username@hostname:path$
         r'\r?\n[^\s@]+@[^\s:]+:[^\s]+[#\$]\s*$',  # username@hostname:path$
         r'\r?\n\[[^\]]+\][#\$]\s*$',            # [user@host dir]$
-        r'\r?\n[#\$>]\s*$',                      # $ or # or >
-        r'[#\$>]\s*$',                           # 末尾的简单提示符
+        # 末尾的简单提示符($ # >)不用正则，由_ends_with_prompt_char检查输出末尾
         # 匹配ANSI转义序列
         r'\r?\n.*\x1b\[[0-9;]*[a-zA-Z].*[#\$>]\s*$',  # 包含ANSI转义序列的提示符
-        # 完全通用的模式，最后的后备方案
-        r'[^\n]*[#\$>]\s*$'                     # 任何以$/#/>结尾的行
-        # apt-get 结束模式 - 通常是空行或只有提示符的行
-        r'Reading package lists... Done\r?\n',    # apt-get update 常见结束标志
-        r'Building dependency tree... Done\r?\n', # apt-get 操作常见结束标志
-        r'Reading state information... Done\r?\n' # apt-get 操作常见结束标志
+        # apt-get 的"... Done"行只是中间进度，不作为提示符，由apt专用逻辑处理
         # 绝对通用的模式 - 移除，因为太容易误匹配
         # r'\n[^\n]{0,40}$'                      # 任何行尾内容，限制长度防止误匹配
     ]
+    _DEFAULT_PROMPT_PATTERNS_COMPILED: ClassVar[tuple] = tuple(re.compile(p, re.MULTILINE) for p in DEFAULT_PROMPT_PATTERNS)
+    _DEFAULT_PROMPT_PATTERNS_UNION: ClassVar[re.Pattern] = _build_union_pattern(DEFAULT_PROMPT_PATTERNS)
+    
+    # 以下固定文本标记各合并为一个转义后的正则，一次扫描即可判断是否包含任一标记
+    # apt仍在下载的标记
+    APT_DOWNLOADING_MARKERS: ClassVar[tuple] = ("%]", "MB/s", "Get:", "Fetched", "Waiting for headers")
+    _APT_DOWNLOADING_RE: ClassVar[re.Pattern] = _compile_literals(APT_DOWNLOADING_MARKERS)
+    # apt-get update完成时依次输出的标记
+    APT_DONE_MARKERS: ClassVar[tuple] = (
+        "Reading package lists... Done",
+        "Building dependency tree... Done",
+        "Reading state information... Done",
+    )
+    # 完成标记(分组d0、d1...)和下载标记(分组dl)合并为一个正则，一次扫描得到全部状态
+    _APT_STATUS_RE: ClassVar[re.Pattern] = re.compile('|'.join(
+        [f'(?P<d{i}>{re.escape(m)})' for i, m in enumerate(APT_DONE_MARKERS)]
+        + ['(?P<dl>' + '|'.join(map(re.escape, APT_DOWNLOADING_MARKERS)) + ')']))
+    # conda安装过程中的关键状态
+    CONDA_PROGRESS_MARKERS: ClassVar[tuple] = (
+        "Downloading and Extracting Packages", "Preparing transaction",
+        "Verifying transaction", "Executing transaction",
+    )
+    _CONDA_PROGRESS_RE: ClassVar[re.Pattern] = _compile_literals(CONDA_PROGRESS_MARKERS)
+    # Docker下载进度
+    DOCKER_PROGRESS_MARKERS: ClassVar[tuple] = ("Downloading", "Pulling", "Extracting", "Waiting", "Verifying")
+    _DOCKER_PROGRESS_RE: ClassVar[re.Pattern] = _compile_literals(DOCKER_PROGRESS_MARKERS)
+    # 分页器(END)附近表示需要用户交互的关键词(忽略大小写)
+    PAGER_END_INTERACTION_KEYWORDS: ClassVar[tuple] = (
+        'continue', 'yes', 'no', 'y/n', 'select', 'choice',
+        'enter', 'proceed', 'confirm', 'abort', 'accept',
+        'press [enter]', 'press enter', 'ctrl-c', 'component', 'repository',
+    )
+    _PAGER_END_INTERACTION_RE: ClassVar[re.Pattern] = _compile_literals(PAGER_END_INTERACTION_KEYWORDS, ignore_case=True)
+    
+    # 特征检测 - 用于Docker容器中的特殊情况，最后一行包含这些文本时视为提示符
+    KNOWN_PROMPTS: ClassVar[tuple] = (
+        "(base) developer@", 
+        "~/code$", 
+        "@110dce07d505:",
+        "root@",
+        # 添加常见的apt-get完成后可能出现的提示符
+        "]:~#",      # root用户家目录提示符
+        "]:/#",      # root用户根目录提示符
+        # 通用的基于用户名的提示符
+        "@ubuntu:",
+        "@debian:",
+    )
+    
+    # 简单提示符的结尾字符
+    PROMPT_SUFFIX_CHARS: ClassVar[str] = '#$>'
+    # 默认提示符模式下，任何提示符可能的结尾字符，包括zsh的%和starship、pure、
+    # powerlevel10k等主题常用的提示符符号
+    PROMPT_END_CHARS: ClassVar[str] = '#$>%❯➜»λ→'
     
     # 需要排除的模式列表，匹配这些模式的提示符不会被视为命令完成
     EXCLUDE_PATTERNS: ClassVar[List[str]] = [
@@ -53,18 +318,21 @@ class SSHTool(BaseTool):
         r'.*\[sudo\].*password.*:.*$',  # 排除sudo密码提示符
         r'.*Password:.*$',           # 排除简单的密码提示符
     ]
+    _EXCLUDE_PATTERNS_COMPILED: ClassVar[tuple] = tuple(re.compile(p, re.MULTILINE) for p in EXCLUDE_PATTERNS)
+    _EXCLUDE_PATTERNS_UNION: ClassVar[re.Pattern] = _build_union_pattern(EXCLUDE_PATTERNS)
     
     # 添加用于检测分页器的模式
     PAGER_PATTERNS: ClassVar[List[str]] = [
-        r'--More--($|\r?\n)',
-        r'--More--.*?($|\r?\n)',
-        r'.*?--More--.*?($|\r?\n)',
-        r'--More--\(\d+%\)($|\r?\n)',
-        r'\(END\)($|\r?\n)',
-        r'\(more\)($|\r?\n)',
+        r'--More--',                 # 包括--More--(50%)等带百分比的形式
+        r'\(END\)\s*$',
+        r'\(more\)\s*$',
         r'Press q to quit, any other key to continue',
         r'Press RETURN to continue'
     ]
+    _PAGER_PATTERNS_COMPILED: ClassVar[tuple] = tuple(re.compile(p, re.MULTILINE) for p in PAGER_PATTERNS)
+    _PAGER_PATTERNS_UNION: ClassVar[re.Pattern] = _build_union_pattern(PAGER_PATTERNS)
+    # 每个分页器模式都至少包含其中一个关键字，不包含时无需运行正则
+    PAGER_KEYWORDS: ClassVar[tuple] = ("--More--", "(END)", "(more)", "Press")
     
     # 添加用于检测交互式提示的模式
     INTERACTIVE_PROMPT_PATTERNS: ClassVar[List[str]] = [
@@ -92,6 +360,13 @@ class SSHTool(BaseTool):
         r'Could not get lock .*/var/lib/dpkg/lock.*', # dpkg锁提示
         r'Could not get lock .*/var/lib/apt/lists/lock.*', # apt lists锁提示
     ]
+    _INTERACTIVE_PROMPT_PATTERNS_COMPILED: ClassVar[tuple] = tuple(re.compile(p, re.MULTILINE) for p in INTERACTIVE_PROMPT_PATTERNS)
+    _INTERACTIVE_PROMPT_PATTERNS_UNION: ClassVar[re.Pattern] = _build_union_pattern(INTERACTIVE_PROMPT_PATTERNS)
+    # 每个交互式提示模式都至少包含其中一个关键字(小写，部分模式忽略大小写)
+    INTERACTIVE_PROMPT_KEYWORDS: ClassVar[tuple] = (
+        "license", "yes", "no", "y/n", "y/[n]", "continue", "select an option",
+        "[", "proceed", "repositories", "lock",
+    )
     
     # 添加用于检测下载进度条模式的正则表达式
     DOWNLOAD_PROGRESS_PATTERNS: ClassVar[List[str]] = [
@@ -131,6 +406,21 @@ class SSHTool(BaseTool):
         r'Unpacking objects:',                  # Git clone unpacking objects
         r'Checking out files:'                  # Git checkout progress
     ]
+    _DOWNLOAD_PROGRESS_PATTERNS_COMPILED: ClassVar[tuple] = tuple(re.compile(p, re.MULTILINE) for p in DOWNLOAD_PROGRESS_PATTERNS)
+    # 不含正则元字符的模式直接用子串查找，其余模式合并为一个正则
+    _DOWNLOAD_PROGRESS_LITERALS: ClassVar[tuple] = tuple(dict.fromkeys(
+        p for p in DOWNLOAD_PROGRESS_PATTERNS if not any(c in p for c in _REGEX_METACHARS)))
+    _DOWNLOAD_PROGRESS_REGEX_SOURCES: ClassVar[tuple] = tuple(
+        p for p in DOWNLOAD_PROGRESS_PATTERNS if any(c in p for c in _REGEX_METACHARS))
+    _DOWNLOAD_PROGRESS_PATTERNS_UNION: ClassVar[re.Pattern] = _build_union_pattern(_DOWNLOAD_PROGRESS_REGEX_SOURCES)
+    _match_download_progress_literal: ClassVar = staticmethod(_build_literal_matcher(_DOWNLOAD_PROGRESS_LITERALS))
+    # 每个下载进度模式都至少包含其中一个关键字
+    DOWNLOAD_PROGRESS_KEYWORDS: ClassVar[tuple] = (
+        "%", "[#", " MB", "Download", "transaction", "Pulling", "Pull complete",
+        "Waiting", "Verifying", "Extracting", "objects:", "deltas:",
+        "Finding sources", "Checking out files:",
+    )
+    _match_download_progress_keyword: ClassVar = staticmethod(_build_literal_matcher(DOWNLOAD_PROGRESS_KEYWORDS))
     
     def __init__(self,
                  host: str,
@@ -148,6 +438,8 @@ class SSHTool(BaseTool):
         self._port = port
         self._timeout = timeout
         self._key_filename = None
+        # 连接参数在初始化时构建一次，重连时直接复用
+        self._connect_kwargs = self._build_connect_kwargs()
         self._client = None
         self._sftp = None
         self._logger = logging.getLogger(__name__)
@@ -156,49 +448,62 @@ class SSHTool(BaseTool):
         self._debug_mode = debug_mode  # 添加调试模式标志
         
         self._pre_execute_command = []
-        self._prompt_patterns = self.DEFAULT_PROMPT_PATTERNS.copy()
-        self._exclude_patterns = self.EXCLUDE_PATTERNS.copy()
-        self._pager_patterns = self.PAGER_PATTERNS.copy()
-        self._interactive_prompt_patterns = self.INTERACTIVE_PROMPT_PATTERNS.copy()
-        self._download_progress_patterns = self.DOWNLOAD_PROGRESS_PATTERNS.copy()
-        
-        self._known_prompts = [
-                    "(base) developer@", 
-                    "~/code$", 
-                    "@110dce07d505:",
-                    "root@",
-                    # 添加常见的apt-get完成后可能出现的提示符
-                    "]:~#",      # root用户家目录提示符
-                    "]:/#",      # root用户根目录提示符
-                    # 通用的基于用户名的提示符
-                    "@ubuntu:",
-                    "@debian:"
-                ]
+        # 使用导入时已编译的正则表达式，避免在读取循环中重复查找编译缓存
+        self._prompt_pattern_sources = list(self.DEFAULT_PROMPT_PATTERNS)
+        self._prompt_patterns = self._DEFAULT_PROMPT_PATTERNS_COMPILED
+        self._exclude_patterns = self._EXCLUDE_PATTERNS_COMPILED
+        self._pager_patterns = self._PAGER_PATTERNS_COMPILED
+        self._interactive_prompt_patterns = self._INTERACTIVE_PROMPT_PATTERNS_COMPILED
+        # 每类模式合并后的正则，读取循环中每类只需扫描一次
+        self._prompt_union = self._DEFAULT_PROMPT_PATTERNS_UNION
+        self._exclude_union = self._EXCLUDE_PATTERNS_UNION
+        self._pager_union = self._PAGER_PATTERNS_UNION
+        self._interactive_prompt_union = self._INTERACTIVE_PROMPT_PATTERNS_UNION
+        self._download_progress_union = self._DOWNLOAD_PROGRESS_PATTERNS_UNION
+        # 是否把以$/#/>结尾的输出视为提示符，自定义提示符模式后关闭
+        self._prompt_suffix_fallback = True
+        # 上一次命令完成时实际出现的提示符末尾，同一通道上后续命令通常以相同提示符结束
+        self._learned_prompt = ""
         
+        self._known_prompts = list(self.KNOWN_PROMPTS)
         self._known_prompts.append(username)
+        # 以$、#或>结尾的特征本身就是提示符的结尾，用endswith元组一次比较；
+        # 其余特征可能出现在提示符中间，合并为一个正则做包含判断
+        self._known_prompt_endings = tuple(p for p in self._known_prompts if p and p[-1] in self.PROMPT_SUFFIX_CHARS)
+        self._known_prompts_re = re.compile('|'.join(
+            re.escape(p) for p in self._known_prompts if p and p[-1] not in self.PROMPT_SUFFIX_CHARS))
         
         # 用于debug日志输出的缓冲区
-        self._debug_log_buffer = []
         self._max_debug_lines = 200
+        self._debug_log_buffer = deque(maxlen=self._max_debug_lines)
+        
+        # 注册了当前通道读事件的selector(Linux上为epoll)，在多条命令之间复用
+        self._selector = None
+        self._selector_channel = None
         
-    def _limited_debug_log(self, message):
+    def _debug_append(self, message, *args):
         """
-        限制debug日志输出行数的辅助方法
+        把debug日志暂存到环形缓冲区，命令结束时由_flush_debug_log统一输出；
+        缓冲区只保留最新的_max_debug_lines行，超出部分自动丢弃
         
         参数:
-            message (str): 要记录的日志消息
+            message (str): 要记录的日志消息，可包含%格式占位符
+            *args: 格式化参数，只有在DEBUG级别启用时才会格式化
         """
-        # 按行分割
-        lines = message.splitlines()
+        # 未启用DEBUG级别时不构造任何日志字符串
+        if not self._logger.isEnabledFor(logging.DEBUG):
+            return
+        if args:
+            message = message % args
+        self._debug_log_buffer.extend(message.splitlines())
         
-        # 如果行数超过最大限制，只保留头尾部分
-        if len(lines) > self._max_debug_lines:
-            head_lines = self._max_debug_lines // 2
-            tail_lines = self._max_debug_lines - head_lines
-            truncated_message = "\n".join(lines[:head_lines]) + f"\n... [截断 {len(lines) - self._max_debug_lines} 行] ...\n" + "\n".join(lines[-tail_lines:])
-            self._logger.debug(truncated_message)
-        else:
-            self._logger.debug(message)
+    def _flush_debug_log(self):
+        """
+        一次性输出并清空缓冲的debug日志
+        """
+        if self._debug_log_buffer:
+            self._logger.debug("\n".join(self._debug_log_buffer))
+            self._debug_log_buffer.clear()
     
     def _limit_output_lines(self, text, max_lines=200):
         """
@@ -213,12 +518,348 @@ class SSHTool(BaseTool):
         """
         if not text:
             return text
+        
+        # 先从末尾向前找到第max_lines+1个\n，之后的部分至少包含max_lines个完整行，
+        # 只需逐行处理这一段，代价与max_lines而不是总行数成正比
+        start = len(text)
+        for _ in range(max_lines + 1):
+            start = text.rfind('\n', 0, start)
+            if start < 0:
+                break
+        # 通用换行模式与splitlines一样把\r\n和\r视为换行
+        last_lines = deque(io.StringIO(text[start + 1:], newline=None), maxlen=max_lines)
+        return '\n'.join(line.rstrip('\n') for line in last_lines)
+        
+    def _ends_with_prompt_char(self, text):
+        """
+        检查输出是否以简单提示符结尾，只比较末尾几个字符而不用正则扫描
+        
+        参数:
+            text (str): 输出内容
             
-        lines = text.splitlines()
-        if len(lines) <= max_lines:
-            return text
+        返回:
+            bool: 末尾(忽略空格)是$、#或>时返回True
+        """
+        if not self._prompt_suffix_fallback:
+            return False
+        stripped = text[-64:].rstrip(' \t')
+        return bool(stripped) and stripped[-1] in self.PROMPT_SUFFIX_CHARS
+        
+    def _prompt_tail(self, text):
+        """
+        取出输出末尾用于判断提示符结尾的一小段，去掉末尾的空白和ANSI颜色序列
         
-        return '\n'.join(lines[-max_lines:])
+        参数:
+            text (str): 输出内容
+            
+        返回:
+            str: 处理后的末尾内容
+        """
+        tail = text[-64:].rstrip()
+        # 只有末尾可能是颜色序列时才运行正则
+        if tail.endswith('m') and '\x1b' in tail:
+            tail = _TRAILING_SGR_RE.sub('', tail)
+        return tail
+        
+    def _matches_known_prompt(self, line):
+        """
+        特征检测：检查一行输出是否包含已知的提示符特征
+        
+        参数:
+            line (str): 输出的最后一行
+            
+        返回:
+            bool: 以已知提示符结尾或包含已知提示符片段时返回True
+        """
+        # 提示符结尾都很短，只取末尾一小段比较，不复制很长的最后一行(如进度条)
+        tail = self._prompt_tail(line)
+        # 默认提示符模式下提示符(去掉颜色序列后)以PROMPT_END_CHARS之一结尾，其他结尾的行
+        # 即使包含用户名或root@等片段(例如回显的"ssh root@server uptime")也不是提示符
+        if self._prompt_suffix_fallback and (not tail or tail[-1] not in self.PROMPT_END_CHARS):
+            return False
+        return (tail.endswith(self._known_prompt_endings)
+                or self._known_prompts_re.search(line) is not None)
+        
+    def _apt_update_finished(self, text):
+        """
+        一次扫描判断apt-get update是否已输出全部完成标记且不再下载
+        
+        参数:
+            text (str): 输出的最后若干行
+            
+        返回:
+            bool: 所有完成标记都出现且没有下载标记时返回True
+        """
+        found = set()
+        for match in self._APT_STATUS_RE.finditer(text):
+            if match.lastgroup == 'dl':
+                return False
+            found.add(match.lastgroup)
+        return len(found) == len(self.APT_DONE_MARKERS)
+        
+    def _detect_prompt_completion(self, output, tail, exclude_match, is_apt_command, label):
+        """
+        交互式和流式执行共用的完成判断：先匹配提示符模式，再做已知提示符特征检测，
+        两者都会被密码提示和apt下载中的状态否决
+        
+        参数:
+            output (str): 当前的全部输出
+            tail (str): 输出末尾用于模式扫描的部分
+            exclude_match: 本轮在tail上搜索排除规则的结果，未命中时为None
+            is_apt_command (bool): 是否为apt命令
+            label (str): 日志前缀，区分交互式和流式命令
+            
+        返回:
+            bool: 判断命令已完成时返回True
+        """
+        # 先用上次学到的提示符做一次endswith比较，不匹配(例如切换了目录)时再运行提示符正则
+        learned = self._learned_prompt
+        learned_hit = bool(learned) and tail[-128:].rstrip().endswith(learned)
+        
+        # 快速路径：默认提示符模式下末尾字符不可能是任何提示符的结尾时(例如持续输出的日志)，
+        # 跳过所有正则和特征检测；学到的提示符是精确匹配，不受此限制
+        if not learned_hit and self._prompt_suffix_fallback:
+            stripped = self._prompt_tail(tail)
+            if not stripped or stripped[-1] not in self.PROMPT_END_CHARS:
+                return False
+        
+        prompt_match = None
+        # 末尾字符不可能是提示符时跳过正则扫描
+        if not learned_hit and self._may_end_with_prompt(tail):
+            prompt_match = self._prompt_union.search(tail)
+        if learned_hit or prompt_match or self._ends_with_prompt_char(tail):
+            if exclude_match is not None:
+                self._logger.info("%s提示符匹配被排除规则覆盖: %s", label, self._exclude_patterns[_union_match_index(exclude_match)].pattern)
+            # 检查是否正在下载 - 避免在下载过程中提前退出
+            elif is_apt_command and self._APT_DOWNLOADING_RE.search(_tail_lines(output, 10)):
+                self._logger.info(f"{label}检测到可能的命令完成，但下载仍在进行，继续等待...")
+            else:
+                if learned_hit:
+                    self._logger.info("%s完成，匹配到已学习的提示符: %r", label, learned)
+                elif prompt_match:
+                    i = _union_match_index(prompt_match)
+                    self._logger.info("%s完成，匹配到提示符模式[%s]: %s", label, i, self._prompt_patterns[i].pattern)
+                else:
+                    self._logger.info("%s完成，输出以提示符结尾: %r", label, tail[-20:])
+                return True
+        else:
+            self._debug_append("%s提示符模式均不匹配, 末尾字符: %r", label, output[-20:])
+        
+        # 特征检测 - 检查输出最后一行是否包含已知的提示符特征
+        last_line = _tail_lines(output, 1)
+        if not self._matches_known_prompt(last_line):
+            return False
+        # 确保不是密码提示；末尾内容未命中排除规则时最后一行也不会命中，无需再扫描
+        if exclude_match is not None:
+            line_exclude_match = self._exclude_union.search(last_line)
+            if line_exclude_match:
+                self._logger.info("%s特征检测匹配被排除规则覆盖: %s", label, self._exclude_patterns[_union_match_index(line_exclude_match)].pattern)
+                return False
+        # 如果是apt命令，检查是否正在下载，避免提前退出
+        if is_apt_command and self._APT_DOWNLOADING_RE.search(_tail_lines(output, 10)):
+            self._logger.info(f"{label}特征检测到可能的命令完成，但下载仍在进行，继续等待...")
+            return False
+        self._logger.info("%s完成，通过特征检测匹配: %r", label, last_line)
+        return True
+        
+    def _strip_trailing_prompt(self, output, debug_mode, label):
+        """
+        命令完成后从输出末尾截掉shell提示符
+        
+        参数:
+            output (str): 命令的全部输出
+            debug_mode (bool): 调试模式下保留提示符
+            label (str): 日志前缀
+            
+        返回:
+            str: 截掉提示符后的输出
+        """
+        # 提示符只会出现在末尾，只从最后OUTPUT_SCAN_TAIL个字符开始搜索
+        start = max(0, len(output) - self.OUTPUT_SCAN_TAIL)
+        for pattern in self._prompt_patterns:
+            match = pattern.search(output, start)
+            if match:
+                prompt_start = match.start()
+                break
+        else:
+            if not self._ends_with_prompt_char(output):
+                return output
+            # 简单提示符独占最后一行，截掉最后一行
+            prompt_start = max(0, output.rfind('\n'))
+        prompt_text = output[prompt_start:]
+        self._logger.info(f"{label}提取到提示符: '{prompt_text}'")
+        # 记住提示符末尾，下一条命令优先用endswith判断
+        self._learned_prompt = prompt_text.strip()[-32:]
+        # 在调试模式下保留提示符，否则移除
+        return output if debug_mode else output[:prompt_start]
+        
+    def _match_download_progress(self, text):
+        """
+        检查新输出中是否有下载/进度条模式：先用子串查找固定文本标记，
+        都不命中时再用关键字预过滤后运行正则
+        
+        参数:
+            text (str): 新接收的输出
+            
+        返回:
+            str: 命中的模式，未命中时返回None
+        """
+        literal = self._match_download_progress_literal(text)
+        if literal:
+            return literal
+        if self._match_download_progress_keyword(text):
+            progress_match = self._download_progress_union.search(text)
+            if progress_match:
+                return self._DOWNLOAD_PROGRESS_REGEX_SOURCES[_union_match_index(progress_match)]
+        return None
+        
+    def _may_end_with_prompt(self, text):
+        """
+        运行提示符正则之前的廉价预检查：默认提示符模式都以$、#或>加空白结尾，
+        末尾(忽略所有空白)不是这些字符时不可能是停在提示符上
+        
+        参数:
+            text (str): 输出末尾内容
+            
+        返回:
+            bool: 需要继续用提示符正则确认时返回True；自定义提示符模式时总是返回True
+        """
+        if not self._prompt_suffix_fallback:
+            return True
+        stripped = text[-64:].rstrip()
+        return bool(stripped) and stripped[-1] in self.PROMPT_SUFFIX_CHARS
+        
+    def _classify_and_timeout(self, command):
+        """
+        对命令分类并确定其超时时间
+        
+        参数:
+            command (str): 要执行的命令
+            
+        返回:
+            tuple: (命令类别集合, 超时时间(秒))
+        """
+        command_types = _classify_command(command)
+        for category, timeout, message in self.COMMAND_TIMEOUTS:
+            if category in command_types:
+                self._logger.info(message)
+                return command_types, timeout
+        return command_types, self.DEFAULT_COMMAND_TIMEOUT
+        
+    def _stall_grace(self, command_types):
+        """
+        确定下载无进度时的宽限时间
+        
+        参数:
+            command_types (frozenset): 命令类别集合
+            
+        返回:
+            tuple: (宽限时间(秒), 日志说明)，没有宽限时为(0, None)
+        """
+        for category, grace, message in self.DOWNLOAD_STALL_GRACE:
+            if category in command_types:
+                return grace, message
+        return 0, None
+        
+    def _drain_channel(self, buffer_size=65535, decoder=None, max_bytes=None):
+        """
+        以非阻塞方式一次性读空通道中已缓冲的全部数据
+        
+        参数:
+            buffer_size (int): 单次recv的缓冲区大小
+            decoder: 增量UTF-8解码器，跨多次读取保留不完整的多字节字符；None时直接解码
+            max_bytes (int): 最多读取的字节数，超出部分留在通道中等下次读取；None表示不限制
+            
+        返回:
+            str: 解码后的数据，没有数据时返回空字符串
+        """
+        chunks = []
+        total = 0
+        previous_timeout = self._channel.gettimeout()
+        self._channel.settimeout(0.0)
+        try:
+            while max_bytes is None or total < max_bytes:
+                data = self._channel.recv(buffer_size)
+                if not data:  # 通道已关闭
+                    break
+                chunks.append(data)
+                total += len(data)
+        except socket.timeout:
+            pass
+        finally:
+            self._channel.settimeout(previous_timeout)
+        # 合并后统一解码，避免多字节字符在分块边界处被截断
+        data = b''.join(chunks)
+        if decoder is not None:
+            return decoder.decode(data)
+        return data.decode('utf-8', errors='replace')
+        
+    def _channel_selector(self):
+        """
+        获取注册了当前通道读事件的selector，通道变化(重新启动shell)时重新创建；
+        与select.select不同，epoll不受文件描述符数量上限(FD_SETSIZE)的限制，
+        同一进程中打开大量SSH连接时也能正常等待
+        
+        返回:
+            selectors.BaseSelector: 当前通道的selector
+        """
+        if self._selector is None or self._selector_channel is not self._channel:
+            if self._selector is not None:
+                self._selector.close()
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self._channel, selectors.EVENT_READ)
+            self._selector_channel = self._channel
+        return self._selector
+        
+    def _wait_readable(self, timeout):
+        """
+        阻塞等待通道可读，数据到达时立即返回，而不是固定sleep后再检查
+        
+        参数:
+            timeout (float): 最长等待时间(秒)
+            
+        返回:
+            bool: 通道有数据可读时返回True
+        """
+        if self._channel.recv_ready():
+            return True
+        return bool(self._channel_selector().select(timeout)) and self._channel.recv_ready()
+        
+    def _extend_output_lines(self, line_buf, pending, part):
+        """
+        把新接收的数据按行追加到行缓冲区
+        
+        参数:
+            line_buf (deque): 保留的完整行，长度受maxlen限制
+            pending (str): 尚未结束的最后一行
+            part (str): 新接收的数据
+            
+        返回:
+            str: 追加后尚未结束的最后一行
+        """
+        # 从末尾最多切分maxlen+1次，一次大块输出也只切出会被保留的行，
+        # 不会为随后就被deque丢弃的行分配字符串
+        pieces = (pending + part).rsplit('\n', line_buf.maxlen + 1)
+        if len(pieces) > line_buf.maxlen + 1:
+            # 第一段是未切分的更早输出，超出了保留范围
+            del pieces[0]
+        line_buf.extend(pieces[:-1])
+        return pieces[-1]
+        
+    def _join_output_lines(self, line_buf, pending):
+        """
+        将保留的完整行和未结束的最后一行拼接为输出文本
+        
+        参数:
+            line_buf (deque): 保留的完整行
+            pending (str): 尚未结束的最后一行
+            
+        返回:
+            str: 拼接后的文本
+        """
+        if not line_buf:
+            return pending
+        return '\n'.join(line_buf) + '\n' + pending
         
     def set_prompt_patterns(self, patterns):
         """
@@ -229,7 +870,14 @@ class SSHTool(BaseTool):
         """
         if not isinstance(patterns, list):
             raise TypeError("Prompt patterns must be a list of regex strings")
-        self._prompt_patterns = patterns
+        # 先全部编译成功再替换，避免无效模式导致实例处于半更新状态
+        compiled = tuple(re.compile(p, re.MULTILINE) for p in patterns)
+        union = _build_union_pattern(patterns)
+        self._prompt_pattern_sources = list(patterns)
+        self._prompt_patterns = compiled
+        self._prompt_union = union
+        self._prompt_suffix_fallback = False
+        self._learned_prompt = ""
         
     def get_prompt_patterns(self):
         """
@@ -238,7 +886,7 @@ class SSHTool(BaseTool):
         返回:
             list: 当前的正则表达式模式列表
         """
-        return self._prompt_patterns.copy()
+        return list(self._prompt_pattern_sources)
     
     def _run(self,
              command: str,
@@ -262,65 +910,82 @@ class SSHTool(BaseTool):
             
             self.start_interactive_shell()
         
-        # 检查是否包含sudo命令，增加特殊处理
-        is_sudo_command = 'sudo ' in command
-        # 检查是否是下载或安装命令
-        is_download_command = any(keyword in command.lower() for keyword in 
-                               ['apt', 'apt-get', 'yum', 'dnf', 'pip', 'conda', 'npm', 'wget', 'curl', 'install', 'update', 'upgrade', 'git', 'clone'])
-        # 检查是否是apt-get update命令
-        is_apt_update = 'apt-get update' in command or 'apt update' in command
-        # 检查是否是docker logs -f命令
-        is_docker_logs_follow = 'docker logs -f' in command or 'docker logs --follow' in command
-        
-        if is_sudo_command:
-            self._logger.info("检测到sudo命令，使用特殊处理逻辑")
-            timeout = 30  # 超时时间增加为900秒
-        elif is_apt_update:
-            self._logger.info("检测到apt-get update命令，使用特殊处理逻辑")
-            timeout = 30  # apt-get update命令使用更长的超时时间
-        elif is_download_command:
-            self._logger.info("检测到可能的下载或安装命令，增加超时时间")
-            timeout = 30  # 下载命令使用更长的超时时间
-        else:
-            timeout = 30  # 超时时间增加为60秒
+        command_types, timeout = self._classify_and_timeout(command)
             
-        # 对于docker logs -f命令，使用特殊处理
-        if is_docker_logs_follow:
-            self._logger.info("检测到docker logs -f命令，等待1秒后立即返回结果")
-            # 发送命令前先清空缓冲区
-            if self._channel.recv_ready():
-                buffer_content = self._channel.recv(65535).decode('utf-8', errors='replace')
-                
-            # 发送命令
-            self._channel.send(command + '\n')
-            
-            # 等待1秒
-            time.sleep(1)
-            
-            # 读取所有可用输出
-            output = ""
-            while self._channel.recv_ready():
-                part = self._channel.recv(65535).decode('utf-8', errors='replace')
-                output += part
-            
-            # 如果需要限制行数，只保留最后的tail_lines行
-            if tail_lines > 0 and output:
-                lines = output.splitlines()
-                if len(lines) > tail_lines:
-                    output = '\n'.join(lines[-tail_lines:])
-                
-            return output
+        # docker logs -f、tail -f等跟踪命令不会结束，使用特殊处理
+        if 'follow' in command_types:
+            self._logger.info("检测到跟踪输出的命令，等待1秒后立即返回结果")
+            return self._run_follow(command, tail_lines, wait=1)
             
         # 默认应用优化设置
         result = self.execute_interactive_command(
             command, 
             tail_lines=tail_lines, 
             timeout=timeout,
+            command_types=command_types,
             # 默认启用输出优化，不需要参数
         )
         
         return result
         
+    def _run_follow(self, command, tail_lines=0, wait=1, buffer_size=65535):
+        """
+        执行docker logs -f、tail -f、journalctl -f等持续输出的跟踪命令：
+        这类命令不会结束也不会出现提示符，等待一小段时间读取已有输出后发送Ctrl+C结束跟踪
+        
+        参数:
+            command (str): 要执行的命令
+            tail_lines (int): 只返回输出的最后几行，0表示返回全部输出
+            wait (float): 发送命令后等待输出的时间(秒)
+            buffer_size (int): 读取缓冲区大小
+            
+        返回:
+            str: 等待期间的命令输出
+        """
+        # 发送命令前先清空缓冲区
+        if self._channel.recv_ready():
+            self._drain_channel(buffer_size)
+            
+        self._channel.send(command + '\n')
+        time.sleep(wait)
+        
+        # 读取所有可用输出
+        output = self._drain_channel(buffer_size)
+        
+        # 发送Ctrl+C中断跟踪，避免后续命令被输入到仍在运行的跟踪命令中
+        self._channel.send('\x03')
+        time.sleep(0.5)  # 等待命令终止
+        
+        # 如果需要限制行数，只保留最后的tail_lines行
+        if tail_lines > 0 and output:
+            output = self._limit_output_lines(output, tail_lines)
+            
+        return output
+        
+    def _build_connect_kwargs(self):
+        """
+        构建paramiko连接参数，密钥文件只在此处检查一次是否存在
+        
+        返回:
+            dict: 传给SSHClient.connect的参数
+        """
+        connect_kwargs = {
+            'hostname': self._host,
+            'port': self._port,
+            'timeout': self._timeout
+        }
+        
+        if self._username:
+            connect_kwargs['username'] = self._username
+        
+        if self._password:
+            connect_kwargs['password'] = self._password
+        
+        if self._key_filename and Path(self._key_filename).exists():
+            connect_kwargs['key_filename'] = str(Path(self._key_filename))
+        
+        return connect_kwargs
+        
     def connect(self):
         """
         建立SSH连接
@@ -332,22 +997,7 @@ class SSHTool(BaseTool):
             self._client = paramiko.SSHClient()
             self._client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
             
-            connect_kwargs = {
-                'hostname': self._host,
-                'port': self._port,
-                'timeout': self._timeout
-            }
-            
-            if self._username:
-                connect_kwargs['username'] = self._username
-            
-            if self._password:
-                connect_kwargs['password'] = self._password
-            
-            if self._key_filename and Path(self._key_filename).exists():
-                connect_kwargs['key_filename'] = self._key_filename
-            
-            self._client.connect(**connect_kwargs)
+            self._client.connect(**self._connect_kwargs)
             self._logger.info(f"成功连接到 {self._host}:{self._port}")
             return True
         except Exception as e:
@@ -358,6 +1008,10 @@ class SSHTool(BaseTool):
         """
         断开SSH连接
         """
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+            self._selector_channel = None
         if self._client:
             self._client.close()
             self._logger.info(f"成功断开与 {self._host}:{self._port} 的连接")
@@ -375,13 +1029,16 @@ class SSHTool(BaseTool):
                 return False
                 
         try:
-            self._channel = self._client.invoke_shell()
+            # 与SSHClient.invoke_shell相同(vt100终端、80x24)，但使用更大的接收窗口打开会话
+            self._channel = self._client.get_transport().open_session(window_size=self.CHANNEL_WINDOW_SIZE)
+            self._channel.get_pty()
+            self._channel.invoke_shell()
             self._interactive_mode = True
             # 等待shell初始化
             time.sleep(1)
             # 清除欢迎消息并记录提示符格式
             if self._channel.recv_ready():
-                welcome = self._channel.recv(4096).decode('utf-8', errors='replace')
+                welcome = self._drain_channel()
                 # 记录原始欢迎消息，用于调试提示符格式
                 self._logger.info(f"Shell欢迎消息: {repr(welcome)}")
                 
@@ -391,10 +1048,14 @@ class SSHTool(BaseTool):
                     potential_prompt = lines[-1]
                     self._logger.info(f"潜在提示符格式: {repr(potential_prompt)}")
                     
-                    # 测试当前模式是否匹配
-                    for pattern in self._prompt_patterns:
-                        if re.search(pattern, welcome, re.MULTILINE):
-                            self._logger.info(f"提示符匹配模式: {pattern}")
+                    # 用预编译的合并正则测试当前模式是否匹配，匹配时把提示符记为已学习的提示符，
+                    # 第一条命令即可用endswith判断完成
+                    prompt_match = self._prompt_union.search(welcome)
+                    if prompt_match:
+                        self._logger.info(f"提示符匹配模式: {self._prompt_patterns[_union_match_index(prompt_match)].pattern}")
+                        # 只有匹配位于欢迎消息末尾时才是当前的提示符
+                        if not welcome[prompt_match.end():].strip():
+                            self._learned_prompt = prompt_match.group().strip()[-32:]
                 
             self._logger.info("交互式shell会话已启动")
             return True
@@ -403,7 +1064,411 @@ class SSHTool(BaseTool):
             self._interactive_mode = False
             return False
         
-    def execute_interactive_command(self, command, blocking=True, timeout=30, buffer_size=65535, tail_lines=0, debug_mode=None):
+    def _read_until_prompt(self, command, command_types, timeout, buffer_size, tail_lines, debug_mode,
+                           label="", on_chunk=None, on_idle=None, handle_interactive=True):
+        """
+        命令发送后读取输出，直到出现提示符、需要用户输入或超时；交互式和流式执行共用这一个读取循环
+        
+        参数:
+            command (str): 已发送的命令
+            command_types (frozenset): 命令类别集合
+            timeout (int): 最大等待时间(秒)
+            buffer_size (int): 读取缓冲区大小
+            tail_lines (int): 调用方需要的最后行数，决定行缓冲区的大小
+            debug_mode (bool): 调试模式下保留提示符
+            label (str): 日志前缀，区分交互式和流式命令
+            on_chunk: 每收到一块新数据或产生需要显示的提示信息时调用，参数为文本；None表示不回显
+            on_idle: 通道空闲时调用，参数为本轮的单调时钟
+            handle_interactive (bool): 是否检测需要用户输入的交互式提示并自动翻过分页器
+        
+        返回:
+            str: 命令输出(未按tail_lines截取)
+        """
+        channel = self._channel
+        logger = self._logger
+        
+        # 命令相关的标志只依赖命令本身，在进入读取循环前一次性求值
+        (is_apt_command, is_apt_update, is_conda_command, is_conda_create, is_docker_command) = (
+            category in command_types for category in (
+                'apt', 'apt_update', 'conda', 'conda_create', 'docker'))
+        
+        output = ""
+        # 使用单调时钟计时，不受系统时间调整影响
+        start_time = time.monotonic()
+        last_output_change_time = start_time
+        
+        sudo_password_detected = False
+        sudo_password_sent = False  # 跟踪是否已发送密码
+        activity_detected = False  # 初始化活动检测变量
+        
+        # 特征检测 - 用于Docker容器中的特殊情况
+        match_known_prompt = self._matches_known_prompt
+        # 命令回显的那一行不是提示符，即使其中包含用户名等提示符特征
+        echoed_command = command.strip()
+        
+        # 用于检测重复的锁等待消息
+        lock_wait_repeats = 0
+        last_lock_message = ""
+        
+        # 用于检测下载/进度条模式
+        download_mode_detected = False
+        last_progress_time = start_time
+        progress_carry = ""
+        # 下载无进度时的宽限时间在命令开始时一次确定
+        stall_grace, stall_message = self._stall_grace(command_types)
+        # 各时间阈值在命令开始时换算成绝对时刻，循环中直接与当前时间比较
+        deadline = start_time + timeout
+        # 距总超时不足20秒时不再发送回车触发响应
+        nudge_deadline = deadline - 20
+        # 没有宽限时间时宽限截止时刻即为开始时刻，判断条件恒不成立
+        grace_deadline = start_time + stall_grace
+        
+        # 只保留最新的若干完整行，pending为尚未结束的最后一行；
+        # 缓冲区大小与命令运行时长无关，同时保证能返回请求的tail_lines行
+        line_buf = deque(maxlen=max(self.OUTPUT_BUFFER_LINES, tail_lines))
+        pending = ""
+        # 增量解码器，保证跨两次读取的多字节字符能被完整解码
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        
+        # 在通道上注册读事件，空闲时阻塞在内核中等待数据，而不是轮询加sleep
+        selector = self._channel_selector()
+        while True:
+            # 等待通道可读，空闲时在selector中休眠而不是空转
+            ready = selector.select(timeout=self.READ_POLL_INTERVAL)
+            # 每轮只读取一次单调时钟，本轮内的时间戳和超时计算都使用它
+            current_time = time.monotonic()
+            if ready and channel.recv_ready():
+                part = self._drain_channel(buffer_size, decoder, self.MAX_DRAIN_BYTES)
+                pending = self._extend_output_lines(line_buf, pending, part)
+                output = self._join_output_lines(line_buf, pending)
+                if on_chunk is not None:
+                    on_chunk(part)
+                
+                # 记录日志，便于调试
+                # 限制debug日志输出，只显示最新的部分内容
+                if len(part) > 400:  # 如果新接收的内容较长
+                    self._debug_append("%s接收到新输出(已截断): %r", label, part[-400:])
+                else:
+                    self._debug_append("%s接收到新输出: %r", label, part)
+                
+                # 提示符、分页器等模式都出现在输出末尾，只扫描末尾部分
+                tail = output[-self.OUTPUT_SCAN_TAIL:]
+                
+                # 无论输出内容是否相同，只要收到新数据就更新时间戳
+                last_output_change_time = current_time
+                
+                # 标记活动状态，用于防止不必要的超时
+                activity_detected = False
+                
+                # 检测是否是下载进度条模式，只扫描新数据和上次末尾的少量字符，与已累积的输出长度无关
+                progress_scan = progress_carry + part
+                progress_carry = progress_scan[-self.PROGRESS_SCAN_CARRY:]
+                progress_pattern = self._match_download_progress(progress_scan)
+                if progress_pattern:
+                    if not download_mode_detected:
+                        logger.info("%s检测到下载/进度条模式: %s", label, progress_pattern)
+                        download_mode_detected = True
+                    last_progress_time = current_time
+                    activity_detected = True
+                    
+                    # 特别是对于conda命令，记录安装过程中的关键状态
+                    if is_conda_command and self._CONDA_PROGRESS_RE.search(part):
+                        logger.info("%s检测到conda安装过程中的关键状态: %s", label, part.strip())
+                    
+                    # 检测Docker下载进度；进度更新会在每次读取时出现，INFO未启用时不处理新数据
+                    if is_docker_command and logger.isEnabledFor(logging.INFO) and self._DOCKER_PROGRESS_RE.search(part):
+                        logger.info("%s检测到Docker操作进度更新: %s", label, part.strip()[-50:])
+                
+                # 检测锁等待消息
+                if "Waiting for cache lock" in part or "Could not get lock" in part:
+                    current_message = part.strip()
+                    
+                    # 如果消息相似于上一条，增加计数
+                    if last_lock_message and (
+                        "Waiting for cache lock" in current_message and "Waiting for cache lock" in last_lock_message or
+                        "Could not get lock" in current_message and "Could not get lock" in last_lock_message
+                    ):
+                        lock_wait_repeats += 1
+                        logger.info("%s检测到重复的锁等待消息，当前重复次数: %s", label, lock_wait_repeats)
+                        
+                        # 如果重复次数达到阈值，中断命令
+                        if lock_wait_repeats >= 3:
+                            logger.info("%s检测到多次重复的锁等待消息，终止命令执行", label)
+                            notice = "\n[系统检测到重复的锁等待消息，需要用户处理]"
+                            output += notice
+                            if on_chunk is not None:
+                                on_chunk(notice + "\n")
+                            break
+                    else:
+                        # 新的锁消息
+                        last_lock_message = current_message
+                        lock_wait_repeats = 1
+                
+                if handle_interactive:
+                    # 需要用户输入时直接中断执行，不自动回应，让用户处理
+                    if self._needs_user_input(tail):
+                        break
+                    pager_action = self._pager_action(tail, line_buf, pending)
+                    # 分页内容结束后出现交互提示时等待用户处理
+                    if pager_action == "input":
+                        break
+                    # 翻过分页器后继续等待新输出
+                    if pager_action == "sent":
+                        last_output_change_time = current_time
+                        continue
+                
+                # 检查是否包含密码提示符
+                exclude_match = self._exclude_union.search(tail)
+                # 每轮只扫描一次排除规则，后续的提示符判断直接使用该结果
+                if exclude_match is not None:
+                    sudo_password_detected = True
+                    logger.info("%s检测到需要输入密码: %s", label, self._exclude_patterns[_union_match_index(exclude_match)].pattern)
+                    # 如果有密码，自动输入密码
+                    if self._password and not sudo_password_sent:
+                        time.sleep(0.5)  # 稍等片刻，确保密码提示完全显示
+                        logger.info("%s发送密码...", label)
+                        channel.send(self._password + '\n')
+                        sudo_password_sent = True  # 标记已发送密码
+                        sudo_password_detected = False  # 重置检测标志
+                        # 更新时间戳，以便有足够时间等待命令完成
+                        last_output_change_time = current_time
+                
+                # 只在未检测到密码提示时检查命令是否完成
+                if not sudo_password_detected:
+                    # 对于apt-get update命令，检查特定完成标记
+                    # 所有Done标记都需要出现在输出的最后部分，且最近没有下载标记；
+                    # 末尾没有"... Done"时不可能完成，无需提取最后20行
+                    if is_apt_update and "... Done" in tail and self._apt_update_finished(_tail_lines(output, 20)):
+                        # 检查是否有一段安静期，表示命令可能已完成
+                        if current_time - last_output_change_time > 5:  # 如果5秒内没有新输出
+                            logger.info("%s检测到apt-get update可能已完成，5秒内无新输出", label)
+                            # 在调试模式下，尝试获取更多数据以确保捕获到提示符
+                            if debug_mode and channel.recv_ready():
+                                additional_output = self._drain_channel(buffer_size, decoder)
+                                if additional_output:
+                                    output += additional_output
+                                    if on_chunk is not None:
+                                        on_chunk(additional_output)
+                                    logger.info("调试模式下获取额外提示符数据: %r", additional_output)
+                            break
+                    
+                    # 对于conda create命令，检查是否有特定的完成标记；标记紧挨着命令结束出现，只查找末尾部分
+                    if is_conda_create and "To activate this environment, use" in tail:
+                        logger.info("%s检测到conda环境创建完成标记", label)
+                        break
+                    
+                    # 检查是否出现了shell提示符或已知提示符特征，表示命令已完成
+                    if self._detect_prompt_completion(output, tail, exclude_match, is_apt_command, label or "命令"):
+                        # 提取提示符之前的输出
+                        output = self._strip_trailing_prompt(output, debug_mode, label)
+                        break
+            else:
+                if on_idle is not None:
+                    on_idle(current_time)
+                
+                # 无数据可读时检查是否超时
+                # 对于下载模式，使用更宽松的超时策略
+                if download_mode_detected:
+                    # 只有在下载模式下超过3分钟没有进度更新时才考虑超时
+                    if current_time - last_progress_time > 180:
+                        # Docker和conda create等耗时命令在宽限时间内不过早判断超时
+                        if current_time < grace_deadline:
+                            logger.info(stall_message)
+                            time.sleep(2)  # 稍作等待
+                            continue
+                        
+                        logger.warning("%s下载模式下长时间无进度更新 (%.1f秒)", label, current_time - last_progress_time)
+                        # 尝试按回车键或空格键继续，合并为一次写入；最近15秒内仍有输出时说明程序在运行，
+                        # 不发送按键以免干扰正在处理的交互程序
+                        if current_time - last_output_change_time > 15 and channel.send_ready():
+                            channel.send('\n ')
+                            time.sleep(1)  # 等待一下看是否有响应
+                        # 等待后重新读取时钟，重置时间戳，给予更多时间
+                        current_time = time.monotonic()
+                        last_progress_time = current_time
+                        last_output_change_time = current_time
+                
+                # 检查是否有命令已完成的迹象
+                # 检查最后一行是否包含提示符
+                last_line = _tail_lines(output, 1)
+                prompt_detected = match_known_prompt(last_line) and not (
+                    echoed_command and last_line.rstrip().endswith(echoed_command))
+                
+                # 如果检测到命令可能已完成，再尝试读取一次
+                if prompt_detected:
+                    if self._wait_readable(0.5):
+                        part = self._drain_channel(buffer_size, decoder, self.MAX_DRAIN_BYTES)
+                        pending = self._extend_output_lines(line_buf, pending, part)
+                        output = self._join_output_lines(line_buf, pending)
+                        if on_chunk is not None:
+                            on_chunk(part)
+                        # 等待过通道可读，需要重新读取时钟
+                        last_output_change_time = time.monotonic()
+                        continue
+                    # 很可能命令已经完成，退出循环
+                    logger.info("%s检测到命令可能已完成: %r", label, last_line)
+                    break
+                
+                # 检查总时间是否超过timeout，强制退出
+                if current_time > deadline:
+                    # 下载模式下，只要进度在最近3分钟内有更新，就继续等待
+                    if download_mode_detected and current_time - last_progress_time < 180:
+                        # 继续等待，不超时
+                        logger.info("%s下载模式中，虽然总时间已超过timeout，但进度仍在更新，继续等待", label)
+                        time.sleep(2)
+                        continue
+                    
+                    # Docker命令特殊处理 - 只要有活动就不超时
+                    if is_docker_command and (activity_detected or current_time - last_output_change_time < 30):
+                        logger.info("Docker命令仍在执行，检测到活动或最近30秒内有输出，继续等待")
+                        time.sleep(2)
+                        # 重置活动检测标志
+                        activity_detected = False
+                        continue
+                    
+                    logger.warning("%s命令执行超时 (总时间: %.1f秒, 最后更新: %.1f秒前)", label,
+                                   current_time - start_time, current_time - last_output_change_time)
+                    notice = "\n[命令执行超时]"
+                    output += notice
+                    if on_chunk is not None:
+                        on_chunk(notice + "\n")
+                    break
+            
+            # 如果长时间没有输出更新，但还未达到总超时时间，发送一个回车尝试触发响应
+            if current_time - last_output_change_time > 15 and current_time < nudge_deadline and not download_mode_detected:
+                logger.info("%s长时间无输出更新，发送回车尝试触发响应", label)
+                channel.send('\n')
+                last_output_change_time = current_time  # 重置时间戳
+        
+        return output
+    
+    def _needs_user_input(self, tail):
+        """
+        检查输出末尾是否停在需要用户输入的交互式提示上(确认提示、conda/apt的继续提示等)
+        
+        参数:
+            tail (str): 输出末尾用于模式扫描的部分
+        
+        返回:
+            bool: 需要用户输入时返回True
+        """
+        interactive_match = None
+        tail_lower = tail.lower()
+        if any(keyword in tail_lower for keyword in self.INTERACTIVE_PROMPT_KEYWORDS):
+            interactive_match = self._interactive_prompt_union.search(tail)
+        if interactive_match:
+            prompt_pattern = self._interactive_prompt_patterns[_union_match_index(interactive_match)]
+            self._logger.info("检测到交互式提示: %s，等待用户输入", prompt_pattern.pattern)
+            return True
+        
+        # 特殊检查：apt安装包提示
+        if "Do you want to continue? [Y/n]" in tail:
+            self._logger.info("检测到apt安装提示，等待用户输入")
+            return True
+        
+        # 特殊检查：conda等工具的Proceed提示
+        if "Proceed ([y]/n)?" in tail:
+            self._logger.info("检测到Proceed确认提示，等待用户输入")
+            return True
+        
+        # 特殊检查：conda环境删除确认提示
+        if ("Do you wish to continue?" in tail or
+                "(y/[n])?" in tail or
+                ("will be deleted" in tail and "continue" in tail)):
+            self._logger.info("检测到conda环境删除确认提示，等待用户输入")
+            return True
+        
+        # 特殊检查：Ubuntu添加组件提示
+        if ("Press [ENTER] to continue" in tail or
+                ("component" in tail and "repositories" in tail and "Press" in tail) or
+                "Adding component" in tail):
+            self._logger.info("检测到Ubuntu添加组件提示，等待用户输入")
+            return True
+        
+        return False
+    
+    def _pager_action(self, tail, line_buf, pending):
+        """
+        输出停在分页器提示上时发送按键翻页或退出分页器
+        
+        参数:
+            tail (str): 输出末尾用于模式扫描的部分
+            line_buf (deque): 保留的完整行
+            pending (str): 尚未结束的最后一行
+        
+        返回:
+            str: 已向分页器发送按键时返回"sent"，分页内容结束后需要用户输入时返回"input"，
+                不在分页器中时返回None
+        """
+        # 分页器提示总是位于输出的最后一行，只检查最后一行，
+        # 避免已处理过的分页器提示在后续输出中被重复检测
+        pager_line = pending if pending.strip() else (line_buf[-1] if line_buf else "")
+        
+        # 先检查是否到达了内容末尾
+        if '(END)' in pager_line:
+            # 检查最后几行是否包含常见的交互提示词，有则等待用户输入
+            last_lines_text = _tail_lines(tail, 5)
+            keyword_match = self._PAGER_END_INTERACTION_RE.search(last_lines_text)
+            if keyword_match is not None:
+                line_start = last_lines_text.rfind('\n', 0, keyword_match.start()) + 1
+                line_end = last_lines_text.find('\n', keyword_match.end())
+                line = last_lines_text[line_start:line_end if line_end >= 0 else None]
+                self._logger.info(f"检测到可能的用户交互提示: {line}")
+                self._logger.info("(END)后检测到可能的交互提示，等待用户输入")
+                return "input"
+            
+            self._logger.info("检测到分页内容已结束 (END)，发送 q 退出分页器")
+            time.sleep(0.5)
+            self._channel.send("q")  # 使用q键退出分页器
+            return "sent"
+        
+        # 检查常规分页器提示
+        pager_match = None
+        if any(keyword in pager_line for keyword in self.PAGER_KEYWORDS):
+            pager_match = self._pager_union.search(pager_line)
+        if pager_match:
+            pager_pattern = self._pager_patterns[_union_match_index(pager_match)]
+            self._logger.info("检测到分页器提示: %s", pager_pattern.pattern)
+            # 发送空格以继续
+            time.sleep(0.1)
+            self._logger.info("发送分页器继续键...")
+            self._channel.send(" ")  # 使用空格键继续
+            return "sent"
+        return None
+    
+    def _finish_output(self, output, command, tail_lines, buffer_size, label="", on_chunk=None):
+        """
+        命令读取结束后的收尾：按tail_lines截取输出，输出只有命令回显时再等待一次
+        
+        参数:
+            output (str): 命令输出
+            command (str): 已发送的命令
+            tail_lines (int): 只返回输出的最后几行，0表示返回全部输出
+            buffer_size (int): 读取缓冲区大小
+            label (str): 日志前缀，区分交互式和流式命令
+            on_chunk: 收到额外输出时调用，None表示不回显
+        
+        返回:
+            str: 最终的命令输出
+        """
+        # 如果需要截取最后几行
+        if tail_lines > 0 and output:
+            output = self._limit_output_lines(output, tail_lines)
+        
+        # 确保输出不仅仅是发送的命令本身
+        if output.strip() == command.strip():
+            self._logger.warning("%s检测到输出与命令相同，可能是提前终止。添加额外等待...", label)
+            # 再等待几秒以获取可能的输出
+            time.sleep(5)
+            if self._channel.recv_ready():
+                additional_output = self._drain_channel(buffer_size)
+                output += additional_output
+                if on_chunk is not None:
+                    on_chunk(additional_output)
+                self._logger.info("%s获取到额外输出: %r", label, additional_output)
+        return output
+    
+    def execute_interactive_command(self, command, blocking=True, timeout=30, buffer_size=65535, tail_lines=0, debug_mode=None, command_types=None):
         """
         在交互式会话中执行命令
         
@@ -414,6 +1479,7 @@ class SSHTool(BaseTool):
             buffer_size (int): 读取缓冲区大小
             tail_lines (int): 只返回输出的最后几行，0表示返回全部输出
             debug_mode (bool): 是否启用调试模式，True时保留提示符，None时使用实例默认设置
+            command_types (frozenset): 调用方已得到的命令类别，此时直接使用传入的timeout；None时在此分类并确定超时时间
             
         返回:
             str: 命令输出结果
@@ -427,550 +1493,96 @@ class SSHTool(BaseTool):
                 return "无法启动交互式shell"
         
         try:
-            # 检查是否包含sudo命令
-            is_sudo_command = 'sudo ' in command
-            
-            # 检查是否是apt相关命令
-            is_apt_command = any(apt_cmd in command for apt_cmd in ['apt-get', 'apt'])
-            
-            # 检查是否是conda命令
-            is_conda_command = 'conda ' in command
-            
-            # 检查是否是Docker命令
-            is_docker_command = 'docker ' in command
+            if command_types is None:
+                command_types, timeout = self._classify_and_timeout(command)
+            is_follow_command = 'follow' in command_types
             
-            # 检查是否是Docker pull命令
-            is_docker_pull = 'docker pull ' in command
-            
-            # 检查是否是Docker logs -f命令
-            is_docker_logs_follow = 'docker logs -f' in command or 'docker logs --follow' in command
-            
-            # 检查是否是下载或安装命令
-            is_download_command = any(keyword in command.lower() for keyword in 
-                               ['apt', 'apt-get', 'yum', 'dnf', 'pip', 'conda', 'npm', 'wget', 'curl', 'install', 'update', 'upgrade', 'git', 'clone'])
-            
-            if is_sudo_command:
-                self._logger.info("检测到sudo命令，使用特殊处理逻辑")
-                timeout = 30  # 超时时间增加为900秒
-            elif is_docker_pull:
-                self._logger.info("检测到docker pull命令，使用特殊处理逻辑")
-                timeout = 30  # Docker pull命令使用更长的超时时间 (1小时)
-            elif is_docker_command:
-                self._logger.info("检测到docker命令，使用特殊处理逻辑") 
-                timeout = 30  # Docker命令使用更长的超时时间 (30分钟)
-            elif is_apt_command:
-                self._logger.info("检测到apt命令，使用特殊处理逻辑")
-                timeout = 30  # apt命令使用更长的超时时间
-            elif is_conda_command:
-                self._logger.info("检测到conda命令，使用特殊处理逻辑")
-                timeout = 30  # conda命令使用更长的超时时间
-            elif is_download_command:
-                self._logger.info("检测到可能的下载或安装命令，增加超时时间")
-                timeout = 30  # 下载命令使用更长的超时时间
-            else:
-                timeout = 30  # 超时时间增加为60秒
+            # 对于docker logs -f等跟踪命令，只等待短暂时间获取最新日志
+            if is_follow_command and not blocking:
+                self._logger.info("跟踪输出的命令，短暂等待获取最新日志")
+                return self._run_follow(command, tail_lines, wait=2, buffer_size=buffer_size)
             
             # 发送命令前先清空缓冲区
             if self._channel.recv_ready():
-                buffer_content = self._channel.recv(buffer_size).decode('utf-8', errors='replace')
-                self._logger.info(f"清除缓冲区，内容: {repr(buffer_content[-100:] if len(buffer_content) > 100 else buffer_content)}")
+                buffer_content = self._drain_channel(buffer_size)
+                self._logger.info("清除缓冲区，内容: %r", buffer_content[-100:])
                 
             # 发送命令
             self._logger.info(f"开始执行命令: {command}")
             self._channel.send(command + '\n')
             
-            # 对于docker logs -f命令，只等待短暂时间获取最新日志
-            if is_docker_logs_follow and not blocking:
-                self._logger.info("docker logs -f命令，短暂等待获取最新日志")
-                time.sleep(2)  # 等待2秒以获取初始日志输出
-                output = ""
-                while self._channel.recv_ready():
-                    part = self._channel.recv(buffer_size).decode('utf-8', errors='replace')
-                    output += part
-                
-                # 发送Ctrl+C中断日志跟踪
-                self._channel.send('\x03')  # 发送Ctrl+C
-                time.sleep(0.5)  # 等待命令终止
-                
-                # 如果需要截取最后几行
-                if tail_lines > 0 and output:
-                    output_lines = output.splitlines()
-                    output = '\n'.join(output_lines[-tail_lines:])
-                    
-                return output
-            
-            # 增加延迟以避免立即触发命令完成检测，尤其是对于长时间运行的命令
-            time.sleep(2)
-            
-            # 读取输出
-            output = ""
-            
             if blocking:
                 # 阻塞模式 - 等待命令执行完成
-                start_time = time.time()
-                last_output_change_time = start_time
-                last_output_length = 0
-                current_time = start_time  # 初始化current_time变量
-                
-                # 用于检测shell提示符的正则表达式模式
-                prompt_patterns = self.get_prompt_patterns()
-                
-                has_data = False
-                command_completed = False
-                sudo_password_detected = False
-                sudo_password_sent = False  # 跟踪是否已发送密码
-                pager_detected = False  # 跟踪是否检测到分页器
-                interactive_prompt_detected = False  # 跟踪是否检测到交互式提示
-                activity_detected = False  # 初始化活动检测变量
-                
-                # 特征检测 - 用于Docker容器中的特殊情况
-                known_prompts = self._known_prompts
-                
-                # 用于检测重复的锁等待消息
-                lock_wait_messages = []
-                lock_wait_repeats = 0
-                last_lock_message = ""
-                
-                # 用于检测下载/进度条模式
-                download_mode_detected = False
-                last_progress_time = start_time
-                
-                while True:
-                    # 检查是否有可读数据
-                    if self._channel.recv_ready():
-                        has_data = True
-                        part = self._channel.recv(buffer_size).decode('utf-8', errors='replace')
-                        output += part
-                        
-                        # 记录日志，便于调试
-                        # 限制debug日志输出，只显示最新的部分内容
-                        if len(part) > 400:  # 如果新接收的内容较长
-                            self._limited_debug_log(f"接收到新输出(已截断): {repr(part[-400:])}")
-                        else:
-                            self._limited_debug_log(f"接收到新输出: {repr(part)}")
-                        
-                        # 如果输出过长，只保留最新的200行
-                        if len(output.splitlines()) > 200:
-                            output = self._limit_output_lines(output)
-                        
-                        # 无论输出内容是否相同，只要收到新数据就更新时间戳
-                        last_output_change_time = time.time()
-                        last_output_length = len(output)
-                        
-                        # 标记活动状态，用于防止不必要的超时
-                        activity_detected = False
-                        
-                        # 检查是否是conda环境创建命令
-                        is_conda_create = 'conda create' in command
-                        
-                        # 检查是否是apt更新命令
-                        is_apt_update = 'apt-get update' in command or 'apt update' in command
-                        
-                        # 检查是否是Docker pull命令
-                        is_docker_pull = 'docker pull' in command
-                        
-                        # 检测是否是下载进度条模式
-                        for progress_pattern in self._download_progress_patterns:
-                            if re.search(progress_pattern, part, re.MULTILINE):
-                                if not download_mode_detected:
-                                    self._logger.info(f"检测到下载/进度条模式: {progress_pattern}")
-                                    download_mode_detected = True
-                                last_progress_time = time.time()
-                                activity_detected = True
-                                
-                                # 特别是对于conda命令，确保我们继续等待，不提前完成
-                                if is_conda_command and any(marker in part for marker in [
-                                    "Downloading and Extracting Packages",
-                                    "Preparing transaction",
-                                    "Verifying transaction",
-                                    "Executing transaction"
-                                ]):
-                                    self._logger.info(f"检测到conda安装过程中的关键状态: {part.strip()}")
-                                    last_output_change_time = time.time()  # 更新时间戳
-                                
-                                # 检测Docker下载进度
-                                if is_docker_command and any(marker in part for marker in [
-                                    "Downloading",
-                                    "Pulling",
-                                    "Extracting",
-                                    "Waiting",
-                                    "Verifying"
-                                ]):
-                                    self._logger.info(f"检测到Docker操作进度更新: {part.strip()[-50:]}")
-                                    last_output_change_time = time.time()  # 更新时间戳
-                                break
-                        
-                        # 检查是否检测到分页器提示
-                        pager_detected = False
-                        interactive_prompt_detected = False
-                        
-                        # 检测锁等待消息
-                        if "Waiting for cache lock" in part or "Could not get lock" in part:
-                            current_message = part.strip()
-                            
-                            # 如果消息相似于上一条，增加计数
-                            if last_lock_message and (
-                                "Waiting for cache lock" in current_message and "Waiting for cache lock" in last_lock_message or
-                                "Could not get lock" in current_message and "Could not get lock" in last_lock_message
-                            ):
-                                lock_wait_repeats += 1
-                                self._logger.info(f"检测到重复的锁等待消息，当前重复次数: {lock_wait_repeats}")
-                                
-                                # 如果重复次数达到阈值，中断命令
-                                if lock_wait_repeats >= 3:
-                                    self._logger.info("检测到多次重复的锁等待消息，终止命令执行")
-                                    interactive_prompt_detected = True
-                                    command_completed = False
-                                    output += "\n[系统检测到重复的锁等待消息，需要用户处理]"
-                                    break
-                            else:
-                                # 新的锁消息
-                                last_lock_message = current_message
-                                lock_wait_repeats = 1
-                        
-                        # 首先检查是否有交互式提示，需要用户输入
-                        for prompt_pattern in self._interactive_prompt_patterns:
-                            if re.search(prompt_pattern, output, re.MULTILINE):
-                                interactive_prompt_detected = True
-                                self._logger.info(f"检测到交互式提示: {prompt_pattern}，等待用户输入")
-                                # 不自动回应，让用户处理
-                                break
-                                
-                        # 特殊检查：apt安装包提示
-                        if not interactive_prompt_detected and "Do you want to continue? [Y/n]" in output:
-                            interactive_prompt_detected = True
-                            self._logger.info("检测到apt安装提示，等待用户输入")
-                        
-                        # 特殊检查：conda等工具的Proceed提示
-                        if not interactive_prompt_detected and "Proceed ([y]/n)?" in output:
-                            interactive_prompt_detected = True
-                            self._logger.info("检测到Proceed确认提示，等待用户输入")
-                            # 不自动回应，让用户处理
-                            command_completed = False
-                            break
-                        
-                        # 特殊检查：conda环境删除确认提示
-                        if not interactive_prompt_detected and (
-                            "Do you wish to continue?" in output or 
-                            "(y/[n])?" in output or
-                            ("will be deleted" in output and "continue" in output)):
-                            interactive_prompt_detected = True
-                            self._logger.info("检测到conda环境删除确认提示，等待用户输入")
-                            command_completed = False
-                            break
-                        
-                        # 特殊检查：Ubuntu添加组件提示
-                        if not interactive_prompt_detected and (
-                            "Press [ENTER] to continue" in output or
-                            ("component" in output and "repositories" in output and "Press" in output) or
-                            "Adding component" in output):
-                            interactive_prompt_detected = True
-                            self._logger.info("检测到Ubuntu添加组件提示，等待用户输入")
-                            command_completed = False
-                            break
-                        
-                        if interactive_prompt_detected:
-                            # 所有交互式提示都直接中断执行，等待用户处理
-                            command_completed = False
-                            break
-                        
-                        # 先检查是否到达了内容末尾
-                        if '(END)' in output or output.rstrip().endswith('(END)'):
-                            # 检查一下是否有明显的用户交互提示
-                            last_lines = output.splitlines()[-5:] if output.splitlines() else []
-                            has_prompt = False
-                            for line in last_lines:
-                                # 检查是否包含常见的交互提示词
-                                if any(keyword in line.lower() for keyword in [
-                                    'continue', 'yes', 'no', 'y/n', 'select', 'choice',
-                                    'enter', 'proceed', 'confirm', 'abort', 'accept',
-                                    'press [enter]', 'press enter', 'ctrl-c', 'component', 'repository'
-                                ]):
-                                    has_prompt = True
-                                    self._logger.info(f"检测到可能的用户交互提示: {line}")
-                                    break
-                            
-                            if has_prompt:
-                                self._logger.info("(END)后检测到可能的交互提示，等待用户输入")
-                                command_completed = False
-                                break
-                            else:
-                                pager_detected = True
-                                self._logger.info("检测到分页内容已结束 (END)，发送 q 退出分页器")
-                                time.sleep(0.5)
-                                self._channel.send("q")  # 使用q键退出分页器
-                                last_output_change_time = time.time()  # 更新时间戳
-                        else:
-                            # 检查常规分页器提示
-                            for pager_pattern in self._pager_patterns:
-                                if re.search(pager_pattern, output, re.MULTILINE):
-                                    pager_detected = True
-                                    self._logger.info(f"检测到分页器提示: {pager_pattern}")
-                                    # 发送空格或回车以继续
-                                    time.sleep(0.1)
-                                    self._logger.info("发送分页器继续键...")
-                                    self._channel.send(" ")  # 使用空格键继续
-                                    last_output_change_time = time.time()  # 更新时间戳
-                                    break
-                        
-                        if pager_detected:
-                            # 如果检测到分页器，继续等待新输出
-                            continue
-                        
-                        # 检查是否包含密码提示符
-                        for exclude_pattern in self._exclude_patterns:
-                            if re.search(exclude_pattern, output, re.MULTILINE):
-                                sudo_password_detected = True
-                                self._logger.info(f"检测到需要输入密码: {exclude_pattern}")
-                                # 如果有密码，自动输入密码
-                                if self._password and sudo_password_detected and not sudo_password_sent:
-                                    time.sleep(0.5)  # 稍等片刻，确保密码提示完全显示
-                                    self._logger.info("发送密码...")
-                                    self._channel.send(self._password + '\n')
-                                    sudo_password_sent = True  # 标记已发送密码
-                                    sudo_password_detected = False  # 重置检测标志
-                                    # 更新时间戳，以便有足够时间等待命令完成
-                                    last_output_change_time = time.time()
-                                    break
-                        
-                        # 只在未检测到密码提示时检查命令是否完成
-                        if not sudo_password_detected:
-                            # 对于apt-get update命令，检查特定完成标记
-                            if is_apt_update and any(marker in output for marker in [
-                                "Reading package lists... Done",
-                                "Building dependency tree... Done", 
-                                "Reading state information... Done"
-                            ]):
-                                # 确保这些标记是输出的最后部分
-                                lines = output.splitlines()
-                                last_20_lines = lines[-20:] if len(lines) > 20 else lines
-                                last_20_text = '\n'.join(last_20_lines)
-                                
-                                # 检查是否下载已完成 - 所有Done标记都需要存在且在输出的最后部分
-                                if all(marker in last_20_text for marker in [
-                                    "Reading package lists... Done",
-                                    "Building dependency tree... Done", 
-                                    "Reading state information... Done"
-                                ]) and not any(downloading_marker in last_20_text for downloading_marker in [
-                                    "%]", "MB/s", "Get:", "Fetched", "Waiting for headers"
-                                ]):
-                                    # 检查是否有一段安静期，表示命令可能已完成
-                                    current_time = time.time()
-                                    if current_time - last_output_change_time > 5:  # 如果5秒内没有新输出
-                                        self._logger.info("检测到apt-get update可能已完成，5秒内无新输出")
-                                        # 在调试模式下，尝试获取更多数据以确保捕获到提示符
-                                        if debug_mode and self._channel.recv_ready():
-                                            additional_output = self._channel.recv(buffer_size).decode('utf-8', errors='replace')
-                                            if additional_output:
-                                                output += additional_output
-                                                self._logger.info(f"调试模式下获取额外提示符数据: {repr(additional_output)}")
-                                                last_output_change_time = time.time()
-                                        command_completed = True
-                                        break
-                            
-                            # 对于conda create命令，检查是否有特定的完成标记
-                            if is_conda_create and "To activate this environment, use" in output:
-                                command_completed = True
-                                self._logger.info("检测到conda环境创建完成标记")
-                                break
-                                
-                            # 检查是否出现了shell提示符，表示命令已完成
-                            for i, pattern in enumerate(prompt_patterns):
-                                if re.search(pattern, output, re.MULTILINE):
-                                    # 检查是否是排除的模式
-                                    is_excluded = False
-                                    for exclude_pattern in self._exclude_patterns:
-                                        if re.search(exclude_pattern, output, re.MULTILINE):
-                                            is_excluded = True
-                                            self._logger.info(f"提示符匹配被排除规则覆盖: {exclude_pattern}")
-                                            break
-                                    
-                                    # 检查是否正在下载 - 避免在下载过程中提前退出
-                                    if is_apt_command:
-                                        lines = output.splitlines()
-                                        last_10_lines = lines[-10:] if len(lines) > 10 else lines
-                                        last_10_text = '\n'.join(last_10_lines)
-                                        
-                                        # 如果最近输出显示正在下载，则不认为命令已完成
-                                        if any(downloading_marker in last_10_text for downloading_marker in [
-                                            "%]", "MB/s", "Get:", "Fetched", "Waiting for headers"
-                                        ]):
-                                            self._logger.info("检测到可能的命令完成，但下载仍在进行，继续等待...")
-                                            is_excluded = True
-                                    
-                                    if not is_excluded:
-                                        command_completed = True
-                                        self._logger.info(f"命令完成，匹配到提示符模式[{i}]: {pattern}")
-                                        break
-                                else:
-                                    # 输出最后20个字符，便于调试
-                                    last_chars = output[-min(20, len(output)):]
-                                    self._limited_debug_log(f"模式[{i}]不匹配: {pattern}, 末尾字符: {repr(last_chars)}")
-                            
-                            # 特征检测 - 检查输出末尾是否包含已知的提示符特征
-                            if not command_completed:
-                                last_line = output.splitlines()[-1] if output.splitlines() else ""
-                                if any(prompt in last_line for prompt in known_prompts):
-                                    # 确保不是密码提示
-                                    is_excluded = False
-                                    for exclude_pattern in self._exclude_patterns:
-                                        if re.search(exclude_pattern, last_line):
-                                            is_excluded = True
-                                            self._logger.info(f"特征检测匹配被排除规则覆盖: {exclude_pattern}")
-                                            break
-                                    
-                                    # 如果是apt命令，检查是否正在下载，避免提前退出
-                                    if is_apt_command and not is_excluded:
-                                        lines = output.splitlines()
-                                        last_10_lines = lines[-10:] if len(lines) > 10 else lines
-                                        last_10_text = '\n'.join(last_10_lines)
-                                        
-                                        # 如果最近输出显示正在下载，则不认为命令已完成
-                                        if any(downloading_marker in last_10_text for downloading_marker in [
-                                            "%]", "MB/s", "Get:", "Fetched", "Waiting for headers"
-                                        ]):
-                                            self._logger.info("特征检测到可能的命令完成，但下载仍在进行，继续等待...")
-                                            is_excluded = True
-                                    
-                                    if not is_excluded:
-                                        command_completed = True
-                                        self._logger.info(f"命令完成，通过特征检测匹配: {repr(last_line)}")
-                            
-                            if command_completed:
-                                # 提取提示符之前的输出
-                                prompt_text = ""
-                                for pattern in prompt_patterns:
-                                    match = re.search(pattern, output, re.MULTILINE)
-                                    if match:
-                                        # 截取到提示符之前的部分作为实际输出
-                                        prompt_text = output[match.start():]
-                                        
-                                        # 在调试模式下保留提示符，否则移除
-                                        if not debug_mode:
-                                            output = output[:match.start()]
-                                        
-                                        self._logger.info(f"提取到提示符: '{prompt_text}'")
-                                        break
-                                break
-                    else:
-                        # 无数据可读时检查是否超时
-                        current_time = time.time()
-                        
-                        # 对于下载模式，使用更宽松的超时策略
-                        if download_mode_detected:
-                            # 只有在下载模式下超过3分钟没有进度更新时才考虑超时
-                            if current_time - last_progress_time > 180:
-                                # 对于Docker pull命令，给予更长的耐心时间
-                                if is_docker_pull and current_time - start_time < 3600:  # 1小时内都不过早判断超时
-                                    self._logger.info(f"Docker pull操作中，给予更多耐心等待时间")
-                                    time.sleep(2)  # 稍作等待
-                                    continue
-                                # 对于Docker命令，给予更长的耐心时间
-                                elif is_docker_command and current_time - start_time < 1800:  # 30分钟内都不过早判断超时
-                                    self._logger.info(f"Docker操作中，给予更多耐心等待时间")
-                                    time.sleep(2)  # 稍作等待
-                                    continue
-                                # 对于conda create命令，给予更长的耐心时间
-                                elif is_conda_create and current_time - start_time < 1800:  # 30分钟内都不过早判断超时
-                                    self._logger.info(f"conda创建环境中，给予更多耐心等待时间")
-                                    time.sleep(2)  # 稍作等待
-                                    continue
-                                
-                                self._logger.warning(f"下载模式下长时间无进度更新 ({(current_time - last_progress_time):.1f}秒)")
-                                # 尝试按回车键或空格键继续
-                                self._channel.send('\n')
-                                self._channel.send(' ')
-                                time.sleep(1)  # 等待一下看是否有响应
-                                # 重置时间戳，给予更多时间
-                                last_progress_time = current_time
-                                last_output_change_time = current_time
-                        
-                        # 检查是否有命令已完成的迹象
-                        # 检查最后一行是否包含提示符
-                        last_line = output.splitlines()[-1] if output.splitlines() else ""
-                        prompt_detected = any(prompt in last_line for prompt in known_prompts)
-                        
-                        # 如果检测到命令可能已完成，再尝试读取一次
-                        if prompt_detected:
-                            time.sleep(0.5)
-                            if self._channel.recv_ready():
-                                part = self._channel.recv(buffer_size).decode('utf-8', errors='replace')
-                                output += part
-                                last_output_change_time = time.time()
-                                continue
-                            else:
-                                # 很可能命令已经完成，设置完成标志并退出循环
-                                command_completed = True
-                                self._logger.info(f"检测到命令可能已完成: {repr(last_line)}")
-                                break
-                        
-                        # 检查总时间是否超过timeout，强制退出
-                        if current_time - start_time > timeout:
-                            # 下载模式下，只要进度在最近3分钟内有更新，就继续等待
-                            if download_mode_detected and current_time - last_progress_time < 180:
-                                # 继续等待，不超时
-                                self._logger.info(f"下载模式中，虽然总时间已超过timeout，但进度仍在更新，继续等待")
-                                time.sleep(2)
-                                continue
-                            
-                            # Docker命令特殊处理 - 只要有活动就不超时
-                            if is_docker_command and (activity_detected or current_time - last_output_change_time < 30):
-                                self._logger.info(f"Docker命令仍在执行，检测到活动或最近30秒内有输出，继续等待")
-                                time.sleep(2)
-                                # 重置活动检测标志
-                                activity_detected = False
-                                continue
-                            
-                            # 如果已经有命令输出且最后一行包含提示符，可能命令已完成
-                            if output and any(prompt in last_line for prompt in known_prompts):
-                                self._logger.info(f"检测到超时但命令可能已完成: {repr(last_line)}")
-                                command_completed = True
-                                break
-                        
-                            self._logger.warning(f"命令执行超时 (总时间: {current_time - start_time:.1f}秒, 最后更新: {current_time - last_output_change_time:.1f}秒前)")
-                            output += "\n[命令执行超时]"
-                            break
-
-                # 如果长时间没有输出更新，但还未达到总超时时间，发送一个回车尝试触发响应
-                current_time = time.time()  # 确保current_time总是被更新
-                if current_time - last_output_change_time > 15 and current_time - start_time < timeout - 20 and not download_mode_detected:
-                    self._logger.info("长时间无输出更新，发送回车尝试触发响应")
-                    self._channel.send('\n')
-                    last_output_change_time = current_time  # 重置时间戳
+                output = self._read_until_prompt(command, command_types, timeout, buffer_size, tail_lines, debug_mode)
             else:
                 # 非阻塞模式 - 等待固定时间
                 time.sleep(2)
-                while self._channel.recv_ready():
-                    part = self._channel.recv(buffer_size).decode('utf-8', errors='replace')
-                    output += part
-                    if len(part) < buffer_size:
-                        break
+                output = self._drain_channel(buffer_size)
             
-            # 如果需要截取最后几行
-            if tail_lines > 0 and output:
-                output_lines = output.splitlines()
-                output = '\n'.join(output_lines[-tail_lines:])
-                
-            # 确保输出不仅仅是发送的命令本身
-            if output.strip() == command.strip():
-                self._logger.warning("检测到输出与命令相同，可能是提前终止。添加额外等待...")
-                # 再等待几秒以获取可能的输出
-                time.sleep(5)
-                if self._channel.recv_ready():
-                    additional_output = self._channel.recv(buffer_size).decode('utf-8', errors='replace')
-                    output += additional_output
-                    self._logger.info(f"获取到额外输出: {repr(additional_output)}")
-                
-            # 限制日志输出量，只显示最后400个字符或少于200行的完整输出
-            output_for_log = output[-400:] if len(output) > 400 else output
-            # 确保日志输出不超过最大行数限制
-            self._logger.info(f"get current output: {output_for_log}")
+            output = self._finish_output(output, command, tail_lines, buffer_size)
+            
+            # 限制日志输出量，只显示最后400个字符；INFO未启用时不做切片
+            if self._logger.isEnabledFor(logging.INFO):
+                self._logger.info("get current output: %s", output[-400:])
             return output
         except Exception as e:
             self._logger.error(f"执行交互式命令失败: {str(e)}")
             return f"执行命令失败: {str(e)}"
+        finally:
+            self._flush_debug_log()
+        
+    def _stream_follow(self, timeout, buffer_size=65535, tail_lines=0, echo=True):
+        """
+        流式读取已发送的跟踪命令(docker logs -f、tail -f等)的输出：每块数据只解码、
+        追加到行缓冲区并回显，不做提示符、密码和下载进度检测；到达timeout后发送Ctrl+C结束跟踪
+        
+        参数:
+            timeout (float): 跟踪的最长时间(秒)
+            buffer_size (int): 读取缓冲区大小
+            tail_lines (int): 只返回输出的最后几行，0表示返回全部输出
+            echo (bool): 是否把输出实时回显到控制台
+            
+        返回:
+            str: 跟踪期间的输出
+        """
+        channel = self._channel
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        line_buf = deque(maxlen=max(self.OUTPUT_BUFFER_LINES, tail_lines))
+        pending = ""
+        stdout = sys.stdout
+        last_flush_time = time.monotonic()
+        deadline = last_flush_time + timeout
+        
+        while not channel.closed:
+            current_time = time.monotonic()
+            if current_time >= deadline:
+                break
+            if not self._wait_readable(min(self.READ_POLL_INTERVAL, deadline - current_time)):
+                # 空闲时把尚未刷新的回显输出到控制台
+                if echo and current_time - last_flush_time >= self.ECHO_FLUSH_INTERVAL:
+                    stdout.flush()
+                    last_flush_time = current_time
+                continue
+            part = self._drain_channel(buffer_size, decoder, self.MAX_DRAIN_BYTES)
+            pending = self._extend_output_lines(line_buf, pending, part)
+            if echo:
+                stdout.write(part)
+                if current_time - last_flush_time >= self.ECHO_FLUSH_INTERVAL:
+                    stdout.flush()
+                    last_flush_time = current_time
+        
+        if echo:
+            stdout.flush()
+        # 发送Ctrl+C中断跟踪，避免后续命令被输入到仍在运行的跟踪命令中
+        if not channel.closed:
+            channel.send('\x03')
         
-    def execute_streaming_command(self, command, timeout=360, buffer_size=1024, tail_lines=0, debug_mode=None):
+        output = self._join_output_lines(line_buf, pending)
+        if tail_lines > 0 and output:
+            output = self._limit_output_lines(output, tail_lines)
+        return output
+        
+    def execute_streaming_command(self, command, timeout=360, buffer_size=65535, tail_lines=0, debug_mode=None, echo=True):
         """
         流式执行命令，实时返回结果
         
@@ -980,6 +1592,7 @@ class SSHTool(BaseTool):
             buffer_size (int): 读取缓冲区大小
             tail_lines (int): 只返回输出的最后几行，0表示返回全部输出
             debug_mode (bool): 是否启用调试模式，True时保留提示符，None时使用实例默认设置
+            echo (bool): 是否把输出实时回显到控制台
             
         返回:
             str: 命令完整输出结果
@@ -992,384 +1605,79 @@ class SSHTool(BaseTool):
             if not self.start_interactive_shell():
                 return "无法启动交互式shell"
         
+        # 通道和日志器在整个读取循环中不变，绑定为局部变量以省去每次的属性查找
+        channel = self._channel
+        logger = self._logger
+        
         try:
-            # 检查是否包含sudo命令
-            is_sudo_command = 'sudo ' in command
-            # 检查是否是下载或安装命令
-            is_download_command = any(keyword in command.lower() for keyword in 
-                                   ['apt', 'apt-get', 'yum', 'dnf', 'pip', 'conda', 'npm', 'wget', 'curl', 'install', 'update', 'upgrade', 'git', 'clone'])
-            
-            # 检查是否是apt相关命令
-            is_apt_command = any(apt_cmd in command for apt_cmd in ['apt-get', 'apt'])
+            # 一次扫描得到命令的全部类别，命令相关的标志在进入读取循环前一次性求值
+            command_types = _classify_command(command)
+            (is_sudo_command, is_download_command, is_apt_command, is_follow_command) = (
+                category in command_types for category in ('sudo', 'download', 'apt', 'follow'))
             
             if is_sudo_command:
-                self._logger.info("流式命令中检测到sudo命令，使用特殊处理逻辑")
+                logger.info("流式命令中检测到sudo命令，使用特殊处理逻辑")
                 timeout = 30  # 超时时间
             elif is_apt_command:
-                self._logger.info("流式命令中检测到apt命令，使用特殊处理逻辑")
+                logger.info("流式命令中检测到apt命令，使用特殊处理逻辑")
                 timeout = 30  # apt命令使用更长的超时时间
             elif is_download_command:
-                self._logger.info("流式命令中检测到可能的下载或安装命令，增加超时时间")
+                logger.info("流式命令中检测到可能的下载或安装命令，增加超时时间")
                 timeout = 30  # 下载命令使用更长的超时时间
             
             # 发送命令前先清空缓冲区
-            if self._channel.recv_ready():
-                buffer_content = self._channel.recv(buffer_size).decode('utf-8', errors='replace')
-                self._logger.info(f"流式命令清除缓冲区，内容: {repr(buffer_content[-100:] if len(buffer_content) > 100 else buffer_content)}")
+            if channel.recv_ready():
+                buffer_content = self._drain_channel(buffer_size)
+                logger.info("流式命令清除缓冲区，内容: %r", buffer_content[-100:])
                 
             # 发送命令
-            self._logger.info(f"开始流式执行命令: {command}")
-            self._channel.send(command + '\n')
-            
-            # 增加延迟以避免立即触发命令完成检测，尤其是对于长时间运行的命令
-            time.sleep(2)
-            
-            # 流式读取输出
-            output = ""
-            start_time = time.time()
-            last_output_change_time = start_time
-            last_output_length = 0
-            current_time = start_time  # 初始化current_time变量
-            
-            # 用于检测shell提示符的正则表达式模式
-            prompt_patterns = self.get_prompt_patterns()
-            
-            command_completed = False
-            sudo_password_detected = False
-            sudo_password_sent = False  # 跟踪是否已发送密码
-            
-            # 特征检测 - 用于Docker容器中的特殊情况
-            known_prompts = [
-                "(base) developer@", 
-                "~/code$", 
-                "@110dce07d505:",
-                "root@",
-                "AquaTao@",
-                "aquatao@",  # 添加小写版本
-                # 添加常见的apt-get完成后可能出现的提示符
-                "]:~#",      # root用户家目录提示符
-                "]:/#",      # root用户根目录提示符
-                # 通用的基于用户名的提示符
-                "@ubuntu:",
-                "@debian:"
-            ]
+            logger.info(f"开始流式执行命令: {command}")
+            channel.send(command + '\n')
             
-            # 用于检测重复的锁等待消息
-            lock_wait_messages = []
-            lock_wait_repeats = 0
-            last_lock_message = ""
+            # 跟踪命令不会结束也不会出现提示符，不做完成检测，只转发输出直到超时
+            if is_follow_command:
+                logger.info("流式命令为跟踪输出的命令，只转发输出，%s秒后结束跟踪", timeout)
+                return self._stream_follow(timeout, buffer_size, tail_lines, echo)
             
-            # 用于检测下载/进度条模式
-            download_mode_detected = False
-            last_progress_time = start_time
-            
-            while True:
-                if self._channel.recv_ready():
-                    part = self._channel.recv(buffer_size).decode('utf-8', errors='replace')
-                    output += part
-                    print(part, end="", flush=True)  # 实时输出到控制台
-                    
-                    # 记录日志，便于调试
-                    # 限制debug日志输出，只显示最新的部分内容
-                    if len(part) > 400:  # 如果新接收的内容较长
-                        self._limited_debug_log(f"流式命令接收到新输出(已截断): {repr(part[-400:])}")
-                    else:
-                        self._limited_debug_log(f"流式命令接收到新输出: {repr(part)}")
-                    
-                    # 如果输出过长，只保留最新的200行
-                    if len(output.splitlines()) > 200:
-                        output = self._limit_output_lines(output)
-                    
-                    # 无论输出内容是否相同，只要收到新数据就更新时间戳
-                    last_output_change_time = time.time()
-                    last_output_length = len(output)
-                    
-                    # 标记活动状态，用于防止不必要的超时
-                    activity_detected = False
-                    
-                    # 检查是否是conda环境创建命令
-                    is_conda_create = 'conda create' in command
-                    
-                    # 检查是否是apt更新命令
-                    is_apt_update = 'apt-get update' in command or 'apt update' in command
-                    
-                    # 检查是否是Docker pull命令
-                    is_docker_pull = 'docker pull' in command
-                    
-                    # 检测是否是下载进度条模式
-                    for progress_pattern in self._download_progress_patterns:
-                        if re.search(progress_pattern, part, re.MULTILINE):
-                            if not download_mode_detected:
-                                self._logger.info(f"流式命令检测到下载/进度条模式: {progress_pattern}")
-                                download_mode_detected = True
-                            last_progress_time = time.time()
-                            activity_detected = True
-                            break
-                    
-                    # 检测锁等待消息
-                    if "Waiting for cache lock" in part or "Could not get lock" in part:
-                        current_message = part.strip()
-                        
-                        # 如果消息相似于上一条，增加计数
-                        if last_lock_message and (
-                            "Waiting for cache lock" in current_message and "Waiting for cache lock" in last_lock_message or
-                            "Could not get lock" in current_message and "Could not get lock" in last_lock_message
-                        ):
-                            lock_wait_repeats += 1
-                            self._logger.info(f"流式命令检测到重复的锁等待消息，当前重复次数: {lock_wait_repeats}")
-                            
-                            # 如果重复次数达到阈值，中断命令
-                            if lock_wait_repeats >= 3:
-                                self._logger.info("流式命令检测到多次重复的锁等待消息，终止命令执行")
-                                print("\n[系统检测到重复的锁等待消息，需要用户处理]", flush=True)
-                                output += "\n[系统检测到重复的锁等待消息，需要用户处理]"
-                                command_completed = True  # 设置为True以结束循环
-                                break
-                        else:
-                            # 新的锁消息
-                            last_lock_message = current_message
-                            lock_wait_repeats = 1
-                    
-                    # 检查是否包含密码提示符
-                    for exclude_pattern in self._exclude_patterns:
-                        if re.search(exclude_pattern, output, re.MULTILINE):
-                            sudo_password_detected = True
-                            self._logger.info(f"流式命令检测到需要输入密码: {exclude_pattern}")
-                            # 如果有密码，自动输入密码
-                            if self._password and sudo_password_detected and not sudo_password_sent:
-                                time.sleep(0.5)  # 稍等片刻，确保密码提示完全显示
-                                self._logger.info("流式命令发送密码...")
-                                self._channel.send(self._password + '\n')
-                                sudo_password_sent = True  # 标记已发送密码
-                                sudo_password_detected = False  # 重置标志
-                                # 更新时间戳，以便有足够时间等待命令完成
-                                last_output_change_time = time.time()
-                                break
-                    
-                    # 只在未检测到密码提示时检查命令是否完成
-                    if not sudo_password_detected:
-                        # 对于apt-get update命令，检查特定完成标记
-                        if is_apt_update and any(marker in output for marker in [
-                            "Reading package lists... Done",
-                            "Building dependency tree... Done", 
-                            "Reading state information... Done"
-                        ]):
-                            # 确保这些标记是输出的最后部分
-                            lines = output.splitlines()
-                            last_20_lines = lines[-20:] if len(lines) > 20 else lines
-                            last_20_text = '\n'.join(last_20_lines)
-                            
-                            # 检查是否下载已完成 - 所有Done标记都需要存在且在输出的最后部分
-                            if all(marker in last_20_text for marker in [
-                                "Reading package lists... Done",
-                                "Building dependency tree... Done", 
-                                "Reading state information... Done"
-                            ]) and not any(downloading_marker in last_20_text for downloading_marker in [
-                                "%]", "MB/s", "Get:", "Fetched", "Waiting for headers"
-                            ]):
-                                # 检查是否有一段安静期，表示命令可能已完成
-                                current_time = time.time()
-                                if current_time - last_output_change_time > 5:  # 如果5秒内没有新输出
-                                    self._logger.info("流式命令检测到apt-get update可能已完成，5秒内无新输出")
-                                    # 在调试模式下，尝试获取更多数据以确保捕获到提示符
-                                    if debug_mode and self._channel.recv_ready():
-                                        additional_output = self._channel.recv(buffer_size).decode('utf-8', errors='replace')
-                                        if additional_output:
-                                            output += additional_output
-                                            self._logger.info(f"调试模式下获取额外提示符数据: {repr(additional_output)}")
-                                            last_output_change_time = time.time()
-                                    command_completed = True
-                                    break
-                        
-                        # 检查是否出现了shell提示符，表示命令已完成
-                        for i, pattern in enumerate(prompt_patterns):
-                            if re.search(pattern, output, re.MULTILINE):
-                                # 检查是否是排除的模式
-                                is_excluded = False
-                                for exclude_pattern in self._exclude_patterns:
-                                    if re.search(exclude_pattern, output, re.MULTILINE):
-                                        is_excluded = True
-                                        self._logger.info(f"流式命令提示符匹配被排除规则覆盖: {exclude_pattern}")
-                                        break
-                                
-                                # 检查是否正在下载 - 避免在下载过程中提前退出
-                                if is_apt_command:
-                                    lines = output.splitlines()
-                                    last_10_lines = lines[-10:] if len(lines) > 10 else lines
-                                    last_10_text = '\n'.join(last_10_lines)
-                                    
-                                    # 如果最近输出显示正在下载，则不认为命令已完成
-                                    if any(downloading_marker in last_10_text for downloading_marker in [
-                                        "%]", "MB/s", "Get:", "Fetched", "Waiting for headers"
-                                    ]):
-                                        self._logger.info("流式命令检测到可能的命令完成，但下载仍在进行，继续等待...")
-                                        is_excluded = True
-                                    
-                                    if not is_excluded:
-                                        command_completed = True
-                                        self._logger.info(f"流式命令完成，匹配到提示符模式[{i}]: {pattern}")
-                                        break
-                            else:
-                                # 输出最后20个字符，便于调试
-                                last_chars = output[-min(20, len(output)):]
-                                self._limited_debug_log(f"流式命令模式[{i}]不匹配: {pattern}, 末尾字符: {repr(last_chars)}")
-                        
-                        # 特征检测 - 检查输出末尾是否包含已知的提示符特征
-                        if not command_completed:
-                            last_line = output.splitlines()[-1] if output.splitlines() else ""
-                            if any(prompt in last_line for prompt in known_prompts):
-                                # 确保不是密码提示
-                                is_excluded = False
-                                for exclude_pattern in self._exclude_patterns:
-                                    if re.search(exclude_pattern, last_line):
-                                        is_excluded = True
-                                        self._logger.info(f"流式命令特征检测匹配被排除规则覆盖: {exclude_pattern}")
-                                        break
-                                
-                                # 如果是apt命令，检查是否正在下载，避免提前退出
-                                if is_apt_command and not is_excluded:
-                                    lines = output.splitlines()
-                                    last_10_lines = lines[-10:] if len(lines) > 10 else lines
-                                    last_10_text = '\n'.join(last_10_lines)
-                                    
-                                    # 如果最近输出显示正在下载，则不认为命令已完成
-                                    if any(downloading_marker in last_10_text for downloading_marker in [
-                                        "%]", "MB/s", "Get:", "Fetched", "Waiting for headers"
-                                    ]):
-                                        self._logger.info("特征检测到可能的命令完成，但下载仍在进行，继续等待...")
-                                        is_excluded = True
-                                    
-                                    if not is_excluded:
-                                        command_completed = True
-                                        self._logger.info(f"流式命令完成，通过特征检测匹配: {repr(last_line)}")
-                        
-                        if command_completed:
-                            # 提取提示符之前的输出
-                            prompt_text = ""
-                            for pattern in prompt_patterns:
-                                match = re.search(pattern, output, re.MULTILINE)
-                                if match:
-                                    # 截取到提示符之前的部分作为实际输出
-                                    prompt_text = output[match.start():]
-                                    
-                                    # 在调试模式下保留提示符，否则移除
-                                    if not debug_mode:
-                                        output = output[:match.start()]
-                                    
-                                    self._logger.info(f"流式命令提取到提示符: '{prompt_text}'")
-                                    break
-                            break
-                else:
-                    current_time = time.time()
-                    
-                    # 对于下载模式，使用更宽松的超时策略
-                    if download_mode_detected:
-                        # 只有在下载模式下超过3分钟没有进度更新时才考虑超时
-                        if current_time - last_progress_time > 180:
-                            # 对于Docker pull命令，给予更长的耐心时间
-                            if is_docker_pull and current_time - start_time < 3600:  # 1小时内都不过早判断超时
-                                self._logger.info(f"Docker pull操作中，给予更多耐心等待时间")
-                                time.sleep(2)  # 稍作等待
-                                continue
-                            # 对于Docker命令，给予更长的耐心时间
-                            elif is_docker_command and current_time - start_time < 1800:  # 30分钟内都不过早判断超时
-                                self._logger.info(f"Docker操作中，给予更多耐心等待时间")
-                                time.sleep(2)  # 稍作等待
-                                continue
-                            # 对于conda create命令，给予更长的耐心时间
-                            elif is_conda_create and current_time - start_time < 1800:  # 30分钟内都不过早判断超时
-                                self._logger.info(f"conda创建环境中，给予更多耐心等待时间")
-                                time.sleep(2)  # 稍作等待
-                                continue
-                                
-                            self._logger.warning(f"下载模式下长时间无进度更新 ({(current_time - last_progress_time):.1f}秒)")
-                            # 尝试按回车键或空格键继续
-                            self._channel.send('\n')
-                            self._channel.send(' ')
-                            time.sleep(1)  # 等待一下看是否有响应
-                            # 重置时间戳，给予更多时间
-                            last_progress_time = current_time
-                            last_output_change_time = current_time
-                    
-                    # 检查是否有命令已完成的迹象
-                    # 检查最后一行是否包含提示符
-                    last_line = output.splitlines()[-1] if output.splitlines() else ""
-                    prompt_detected = any(prompt in last_line for prompt in known_prompts)
-                    
-                    # 如果检测到命令可能已完成，再尝试读取一次
-                    if prompt_detected:
-                        time.sleep(0.5)
-                        if self._channel.recv_ready():
-                            part = self._channel.recv(buffer_size).decode('utf-8', errors='replace')
-                            output += part
-                            print(part, end="", flush=True)
-                            last_output_change_time = time.time()
-                            continue
-                        else:
-                            # 很可能命令已经完成，设置完成标志并退出循环
-                            command_completed = True
-                            self._logger.info(f"流式命令检测到命令可能已完成: {repr(last_line)}")
-                            break
-                    
-                    # 检查总时间是否超过timeout，强制退出
-                    if current_time - start_time > timeout:
-                        # 下载模式下，只要进度在最近3分钟内有更新，就继续等待
-                        if download_mode_detected and current_time - last_progress_time < 180:
-                            # 继续等待，不超时
-                            self._logger.info(f"流式命令下载模式中，虽然总时间已超过timeout，但进度仍在更新，继续等待")
-                            time.sleep(2)
-                            continue
-                        
-                        # Docker命令特殊处理 - 只要有活动就不超时
-                        if is_docker_command and (activity_detected or current_time - last_output_change_time < 30):
-                            self._logger.info(f"Docker命令仍在执行，检测到活动或最近30秒内有输出，继续等待")
-                            time.sleep(2)
-                            # 重置活动检测标志
-                            activity_detected = False
-                            continue
-                        
-                        # 如果已经有命令输出且最后一行包含提示符，可能命令已完成
-                        if output and any(prompt in last_line for prompt in known_prompts):
-                            self._logger.info(f"流式命令检测到超时但命令可能已完成: {repr(last_line)}")
-                            command_completed = True
-                            break
-                    
-                        self._logger.warning(f"流式命令执行超时 (总时间: {current_time - start_time:.1f}秒, 最后更新: {current_time - last_output_change_time:.1f}秒前)")
-                        output += "\n[命令执行超时]"
-                        print("\n[命令执行超时]", flush=True)
-                        break
+            # 回显时直接写入stdout的缓冲区，只在行结束或超过刷新间隔时刷新，避免每块数据都触发一次write系统调用
+            if echo:
+                stdout = sys.stdout
+                last_flush_time = time.monotonic()
                 
-                # 如果长时间没有输出更新，但还未达到总超时时间，发送一个回车尝试触发响应
-                current_time = time.time()  # 确保current_time总是被更新
-                if current_time - last_output_change_time > 15 and current_time - start_time < timeout - 20 and not download_mode_detected:
-                    self._logger.info("流式命令长时间无输出更新，发送回车尝试触发响应")
-                    self._channel.send('\n')
-                    last_output_change_time = current_time  # 重置时间戳
-                    
-                # 短暂等待以减少CPU使用
-                time.sleep(0.1)
-            
-            # 如果需要截取最后几行
-            if tail_lines > 0 and output:
-                output_lines = output.splitlines()
-                output = '\n'.join(output_lines[-tail_lines:])
+                def on_chunk(part):
+                    nonlocal last_flush_time
+                    stdout.write(part)
+                    now = time.monotonic()
+                    if part.endswith('\n') or now - last_flush_time >= self.ECHO_FLUSH_INTERVAL:
+                        stdout.flush()
+                        last_flush_time = now
                 
-            # 确保输出不仅仅是发送的命令本身
-            if output.strip() == command.strip():
-                self._logger.warning("流式命令检测到输出与命令相同，可能是提前终止。添加额外等待...")
-                # 再等待几秒以获取可能的输出
-                time.sleep(5)
-                if self._channel.recv_ready():
-                    additional_output = self._channel.recv(buffer_size).decode('utf-8', errors='replace')
-                    output += additional_output
-                    print(additional_output, end="", flush=True)  # 实时输出到控制台
-                    self._logger.info(f"流式命令获取到额外输出: {repr(additional_output)}")
+                def on_idle(current_time):
+                    # 空闲时把尚未刷新的回显(如不以换行结尾的提示)输出到控制台
+                    nonlocal last_flush_time
+                    if current_time - last_flush_time >= self.ECHO_FLUSH_INTERVAL:
+                        stdout.flush()
+                        last_flush_time = current_time
+            else:
+                on_chunk = on_idle = None
+            
+            # 流式执行不处理分页器和交互式提示，其余读取逻辑与交互式执行相同
+            output = self._read_until_prompt(
+                command, command_types, timeout, buffer_size, tail_lines, debug_mode,
+                label="流式命令", on_chunk=on_chunk, on_idle=on_idle, handle_interactive=False,
+            )
+            output = self._finish_output(output, command, tail_lines, buffer_size, "流式命令", on_chunk)
+            
+            if echo:
+                stdout.flush()
             
             return output
         except Exception as e:
             error_msg = f"流式执行命令失败: {str(e)}"
-            self._logger.error(error_msg)
+            logger.error(error_msg)
             return error_msg
+        finally:
+            self._flush_debug_log()
         
     def add_pre_execute_command(self, command):
         """
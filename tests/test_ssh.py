@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("paramiko")
+
+from AquaAgent.core.tool.ssh import SSHTool, _classify_command
+
+
+@pytest.mark.parametrize("command", [
+    "docker logs -f ragflow-server",
+    "docker logs --tail 100 -f ragflow-server",
+    "docker logs -tf ragflow-server",
+    "tail -f /var/log/syslog",
+    "tail -fn 100 /var/log/syslog",
+    "tail -n 50 -F app.log",
+    "journalctl -u nginx --follow",
+    "journalctl -fu nginx",
+])
+def test_follow_commands(command):
+    assert "follow" in _classify_command(command)
+
+
+@pytest.mark.parametrize("command", [
+    "tail -n 5 app.log",
+    "tail app.log | grep -f patterns",
+    "journalctl -F _PID",
+    "journalctl -u nginx -n 20",
+    "docker logs ragflow-server",
+    "cat file-f",
+])
+def test_non_follow_commands(command):
+    assert "follow" not in _classify_command(command)
+
+
+@pytest.mark.parametrize("line", [
+    "aqualab@host:~$ ",
+    "aqualab@host ~ ❯ ",
+    "\x1b[32maqualab@host\x1b[0m:~$ \x1b[0m",
+    "root@box:/# \x1b[0m",
+])
+def test_known_prompt_lines(line):
+    tool = SSHTool(host="localhost", username="aqualab", password="pw")
+    assert tool._matches_known_prompt(line)
+
+
+@pytest.mark.parametrize("line", [
+    "cd /home/aqualab && make",
+    "ssh root@server uptime",
+])
+def test_command_echo_is_not_a_prompt(line):
+    tool = SSHTool(host="localhost", username="aqualab", password="pw")
+    assert not tool._matches_known_prompt(line)
@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip("langgraph")
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from AquaAgent.agent.system_operation import _trim_history
+
+
+def _tool_turn(request, rounds, result_size):
+    messages = [HumanMessage(content=request)]
+    for i in range(rounds):
+        call_id = f"call-{request}-{i}"
+        messages.append(AIMessage(content="", tool_calls=[{"name": "ssh", "args": {"command": f"cmd {i}"}, "id": call_id}]))
+        messages.append(ToolMessage(content="x " * result_size, tool_call_id=call_id))
+    return messages
+
+
+def test_long_tool_turn_keeps_request_and_tool_results():
+    system = SystemMessage(content="system prompt")
+    turn = _tool_turn("deploy ragflow", rounds=3, result_size=5000)
+    # 首轮对话中系统提示位于用户消息之后
+    messages = [turn[0], system] + turn[1:]
+    
+    trimmed = _trim_history(messages, max_tokens=1000)
+    
+    assert trimmed[0] is system
+    assert trimmed[1:] == turn
+
+
+def test_earlier_history_trimmed_within_budget():
+    system = SystemMessage(content="system prompt")
+    old_turn = _tool_turn("old request", rounds=2, result_size=3000)
+    recent_turn = [HumanMessage(content="short question"), AIMessage(content="short answer")]
+    current_turn = [HumanMessage(content="current request")]
+    messages = [old_turn[0], system] + old_turn[1:] + recent_turn + current_turn
+    
+    trimmed = _trim_history(messages, max_tokens=200)
+    
+    assert trimmed == [system] + recent_turn + current_turn